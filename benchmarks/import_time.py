@@ -0,0 +1,85 @@
+# Import-time benchmark for the mwc package
+#
+# Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+# each module and reports the cumulative import time of the module itself,
+# plus the heavy third party packages that got pulled in along the way.
+#
+# usage: python benchmarks/import_time.py [--runs N] [--budget-ms MS] [--json]
+#
+# The script exits non-zero when importing a module loads one of the HEAVY
+# packages, and with --budget-ms also when any module takes longer than the
+# budget, so it can gate CI against startup regressions.
+
+import argparse, json, os, subprocess, sys
+
+MODULES = ['mwc.node_v2', 'mwc.wallet_v3', 'mwc.transport', 'mwc.models', 'mwc.chain_watcher',
+           'mwc.confirmations', 'mwc.limits', 'mwc.wallet_manager', 'mwc.payment_proofs',
+           'mwc.export', 'mwc.scan', 'mwc.consolidation', 'mwc.header_store', 'mwc.cli']
+
+# Packages that should not be loaded just by importing the mwc modules
+HEAVY = ['requests', 'ecies', 'coincurve', 'Crypto']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module):
+    '''Return (cumulative microseconds for module, set of top level packages imported)'''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          env=env, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                          universal_newlines=True, check=True)
+    cumulative = None
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = [p.strip() for p in line[len('import time:'):].split('|')]
+        if not parts[1].isdigit():
+            continue
+        name = parts[2].strip()
+        loaded.add(name.split('.')[0])
+        if name == module:
+            cumulative = int(parts[1])
+    return cumulative, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import time of the mwc modules')
+    parser.add_argument('--runs', type=int, default=5, help='runs per module, the best one is reported')
+    parser.add_argument('--budget-ms', type=float, default=None, help='fail if any module exceeds this')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for module in MODULES:
+        runs = [import_time(module) for _ in range(args.runs)]
+        best = min(r[0] for r in runs)
+        results[module] = {
+            'import_ms': best / 1000.0,
+            'heavy_imports': sorted(p for p in HEAVY if p in runs[0][1]),
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for module, result in results.items():
+            heavy = ', '.join(result['heavy_imports']) or '-'
+            print(f"{module:20} {result['import_ms']:8.2f} ms   heavy imports: {heavy}")
+
+    status = 0
+    heavy = [m for m, r in results.items() if r['heavy_imports']]
+    if heavy:
+        print(f"heavy packages imported by: {', '.join(heavy)}", file=sys.stderr)
+        status = 1
+    if args.budget_ms is not None:
+        over = [m for m, r in results.items() if r['import_ms'] > args.budget_ms]
+        if over:
+            print(f"import time budget of {args.budget_ms} ms exceeded by: {', '.join(over)}", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# Memory benchmark for mwc.models
+#
+# Builds synthetic retrieve_outputs / retrieve_txs results shaped like the
+# wallet API returns them and compares the memory held by the raw dicts with
+# the memory held by the parsed OutputCommit / TxLogEntry records.
+#
+# usage: python benchmarks/models_memory.py [--outputs N] [--txs N]
+
+import argparse, gc, json, os, random, sys, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mwc.models import parse_outputs, parse_txs
+
+STATUSES = ['Unspent', 'Spent', 'Locked', 'Unconfirmed']
+TX_TYPES = ['TxSent', 'TxReceived', 'ConfirmedCoinbase']
+
+
+def synthetic_outputs(count):
+    outputs = []
+    for i in range(count):
+        commit = '08' + '%064x' % random.getrandbits(256)
+        outputs.append({'commit': commit, 'output': {
+            'commit': commit,
+            'height': str(1000000 + i),
+            'is_coinbase': i % 50 == 0,
+            'key_id': '03000000000000000000%012x00000000' % i,
+            'lock_height': str(1000000 + i),
+            'mmr_index': 5000000 + i,
+            'n_child': i,
+            'root_key_id': '0200000000000000000000000000000000',
+            'status': random.choice(STATUSES),
+            'tx_log_entry': i,
+            'value': str(random.randint(1, 10 ** 11)),
+        }})
+    return outputs
+
+
+def synthetic_txs(count):
+    txs = []
+    for i in range(count):
+        txs.append({
+            'amount_credited': str(random.randint(0, 10 ** 11)),
+            'amount_debited': str(random.randint(0, 10 ** 11)),
+            'confirmation_ts': '2024-05-01T10:00:00.123456789+00:00',
+            'confirmed': True,
+            'creation_ts': '2024-05-01T09:59:00.123456789+00:00',
+            'fee': '8000000',
+            'id': i,
+            'kernel_excess': '08' + '%064x' % random.getrandbits(256),
+            'kernel_lookup_min_height': 1000000 + i,
+            'messages': None,
+            'num_inputs': 1,
+            'num_outputs': 2,
+            'output_height': 1000000 + i,
+            'parent_key_id': '0200000000000000000000000000000000',
+            'payment_proof': None,
+            'stored_tx': None,
+            'ttl_cutoff_height': None,
+            'tx_slate_id': '1f3d23da-4790-4081-84ba-dd02c22477fb',
+            'tx_type': random.choice(TX_TYPES),
+        })
+    return txs
+
+
+def measure(build):
+    '''Bytes still allocated by the object returned from build()'''
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory of raw dicts and mwc.models records')
+    parser.add_argument('--outputs', type=int, default=50000)
+    parser.add_argument('--txs', type=int, default=50000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    for name, data, parse in (('outputs', json.dumps(synthetic_outputs(args.outputs)), parse_outputs),
+                              ('txs', json.dumps(synthetic_txs(args.txs)), parse_txs)):
+        # Decode from JSON as the clients do, so strings are not shared with the generator
+        raw, raw_size = measure(lambda: json.loads(data))
+        count = len(raw)
+        del raw
+        records, records_size = measure(lambda: parse(json.loads(data)))
+        del records
+        print(f'{name:8} {count:7} records   dicts {raw_size / 2**20:8.1f} MiB   '
+              f'records {records_size / 2**20:8.1f} MiB   saved {100 * (1 - records_size / raw_size):5.1f}%')
+
+
+if __name__ == '__main__':
+    main()
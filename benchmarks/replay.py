@@ -0,0 +1,89 @@
+# Throughput benchmark on top of a recorded workload
+#
+# Replays the calls of a RecordingTransport file through WalletV3 / NodeV2
+# against a ReplayTransport, so the client side of the library (payload
+# building, encryption, parsing) is measured without a node or wallet.
+# Run it with different library versions on PYTHONPATH to compare them.
+#
+# usage: python benchmarks/replay.py workflow.jsonl [--concurrency N] [--repeat N]
+#                                    [--timing none|original|<scale>]
+
+import argparse, json, os, sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mwc.node_v2 import NodeV2, NodeError
+from mwc.transport import ReplayTransport
+from mwc.wallet_v3 import WalletV3, WalletError
+
+
+def load_calls(path):
+    calls = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                calls.append((entry['url'], entry['encrypted'], entry['request']['method'],
+                              entry['request']['params']))
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded workload and measure throughput')
+    parser.add_argument('recording')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=1, help='times the recorded calls are issued')
+    parser.add_argument('--timing', default='none', help="none, original or a delay scale factor")
+    args = parser.parse_args()
+
+    timing = None if args.timing == 'none' else args.timing
+    transport = ReplayTransport(args.recording, timing=timing)
+    calls = load_calls(args.recording)
+
+    wallets = {}
+    nodes = {}
+    for url, encrypted, method, params in calls:
+        if method == 'init_secure_api' and url not in wallets:
+            wallet = WalletV3(url, None, None, transport=transport)
+            wallet.init_secure_api()
+            wallets[url] = wallet
+        elif url not in wallets and url not in nodes:
+            nodes[url] = NodeV2(url, None, None, url, None, None, transport=transport)
+    work = [c for c in calls if c[2] != 'init_secure_api'] * args.repeat
+
+    def issue(call):
+        url, encrypted, method, params = call
+        start = time.monotonic()
+        try:
+            if encrypted:
+                wallets[url].post_encrypted(method, params)
+            elif url in wallets:
+                wallets[url].post(method, params)
+            else:
+                nodes[url].post(method, params, 'foreign')
+            ok = True
+        except (WalletError, NodeError):
+            ok = False
+        return time.monotonic() - start, ok
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(issue, work))
+    elapsed = time.monotonic() - start
+
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if not r[1])
+    if not latencies:
+        print('recording holds no calls')
+        return 1
+    print(f'calls: {len(results)}  errors: {errors}  elapsed: {elapsed:.3f}s  '
+          f'throughput: {len(results) / elapsed:.1f} calls/s')
+    print(f'latency p50: {latencies[len(latencies) // 2] * 1000:.2f} ms  '
+          f'p95: {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms  '
+          f'max: {latencies[-1] * 1000:.2f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,26 @@
 import os
-import requests
+from mwc.transport import default_transport
 from mwc.wallet_v3 import WalletV3
 
 
-def receive_transaction(wallet: WalletV3, foreign_api_url, slatepack_message):
+def post_foreign(wallet: WalletV3, foreign_api_url, payload, transport=None):
+    """
+    Post a JSON-RPC payload to a wallet foreign API through a mwc.transport
+    transport, by default the one of the wallet, so the call is recorded and
+    replayed along with the owner API calls.
+    """
+    transport = transport or wallet.transport or default_transport()
+    return transport.post(foreign_api_url, payload, None)
+
+
+def receive_transaction(wallet: WalletV3, foreign_api_url, slatepack_message, transport=None):
     """
     Receive a transaction by sending the slatepack message to the foreign API.
 
     Parameters:
     foreign_api_url (str): URL of the foreign API endpoint.
     slatepack_message (str): Slatepack message received from the sender.
+    transport (optional): mwc.transport transport, default the wallet's.
 
     Returns:
     Response: The response object from the foreign API after processing the transaction.
@@ -32,17 +43,18 @@ def receive_transaction(wallet: WalletV3, foreign_api_url, slatepack_message):
     _decoded_slate = wallet.decode_slatepack_message(slatepack_message)
 
     # Make the POST request to the foreign API
-    response = requests.post(foreign_api_url, json=payload)
+    response = post_foreign(wallet, foreign_api_url, payload, transport)
 
     return response
 
-def get_slatepack_address(wallet: WalletV3, foreign_api_url, slatepack_message):
+def get_slatepack_address(wallet: WalletV3, foreign_api_url, slatepack_message, transport=None):
     """
     Receive a transaction by sending the slatepack message to the foreign API.
 
     Parameters:
     foreign_api_url (str): URL of the foreign API endpoint.
     slatepack_message (str): Slatepack message received from the sender.
+    transport (optional): mwc.transport transport, default the wallet's.
 
     Returns:
     Response: The response object from the foreign API after processing the transaction.
@@ -65,7 +77,7 @@ def get_slatepack_address(wallet: WalletV3, foreign_api_url, slatepack_message):
     _decoded_slate = wallet.decode_slatepack_message(slatepack_message)
 
     # Make the POST request to the foreign API
-    response = requests.post(foreign_api_url, json=payload)
+    response = post_foreign(wallet, foreign_api_url, payload, transport)
 
     return response
 
@@ -1,4 +1,5 @@
 import os
+from mwc.transport import HttpTransport, RecordingTransport, ReplayTransport
 from mwc.wallet_v3 import WalletV3
 import examples.sender as sender
 import examples.recipient as recipient
@@ -86,25 +87,37 @@ if __name__ == '__main__':
     api_secret_file_path = os.path.join(home_directory, '.mwc/main/.owner_api_secret')
     api_user = 'mwc'
 
-    with open(api_secret_file_path) as api_secret_file:
-        api_password = api_secret_file.read().strip()
+    # Parse command line arguments for the amount of MWC to send
+    parser = argparse.ArgumentParser(description='Complete MWC Transaction Workflow')
+    parser.add_argument('amount', metavar='amount', type=str, nargs=1,
+                        help='Amount of MWC to send (e.g., 1.23)')
+    parser.add_argument('--record', help='record every owner and foreign API call to this file')
+    parser.add_argument('--replay', help='run offline against a file written with --record')
+    args = parser.parse_args()
+
+    # Every call, owner and foreign API alike, goes through one transport, so a
+    # recorded run can be replayed without any wallet (passwords are redacted
+    # in recordings, any value matches on replay)
+    if args.replay:
+        transport = ReplayTransport(args.replay)
+        api_password = wallet_password = 'replay'
+    else:
+        transport = HttpTransport()
+        if args.record:
+            transport = RecordingTransport(transport, args.record)
+        with open(api_secret_file_path) as api_secret_file:
+            api_password = api_secret_file.read().strip()
+        wallet_password = input('Enter your wallet password: ')
 
     # Initialize the sender wallet and open it
-    wallet = WalletV3(owner_api_url, api_user, api_password)
+    wallet = WalletV3(owner_api_url, api_user, api_password, transport=transport)
     wallet.init_secure_api()
-    wallet_password = input('Enter your wallet password: ')
     wallet.open_wallet(None, wallet_password)
 
     # This is the recipient's Slatepack address, where we send the initial Slatepack.
     # The recipient will then produce a response Slatepack using their own wallet.
     recipient_address = 'grxdcrjcvdq7aipjzuejjngr3til7euryqrpmtjg4hdqxnx3jyfst2qd'
 
-    # Parse command line arguments for the amount of MWC to send
-    parser = argparse.ArgumentParser(description='Complete MWC Transaction Workflow')
-    parser.add_argument('amount', metavar='amount', type=str, nargs=1,
-                        help='Amount of MWC to send (e.g., 1.23)')
-    args = parser.parse_args()
-
     # Convert the amount into micro-MWC (1 MWC = 1_000_000_000 micro-MWC)
     amount_micro_mwc = int(Decimal(args.amount[0]) * int(1_000_000_000))
 
@@ -121,3 +134,5 @@ if __name__ == '__main__':
         print(f"Finalized Slatepack:\n{transaction_result['finalized_slatepack']}")
     except Exception as e:
         print(f"Error during transaction workflow: {e}")
+    finally:
+        transport.close()
@@ -0,0 +1,242 @@
+# Columnar analytics over wallet outputs and transaction history
+#
+# Converts WalletV3.retrieve_outputs / retrieve_txs results (raw dicts or
+# mwc.models records) into NumPy structured arrays and provides vectorized
+# aggregates over them. pandas and pyarrow tables are available as optional
+# views of the same columns.
+#
+# numpy is an optional dependency of the mwc package: it is only needed when
+# this module is imported.
+#
+# usage:
+#   outputs = outputs_to_array(wallet.retrieve_outputs(include_spent=True))
+#   balance_by_status(outputs)
+#   age_histogram(outputs, tip_height, bins=[0, 10, 1440, 10080])
+#
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError('mwc.analytics requires numpy, install it with: pip install numpy') from e
+
+from mwc.models import OutputCommit, TxLogEntry
+
+# Status and tx type strings are stored as small integer codes
+OUTPUT_STATUSES = ('Unconfirmed', 'Unspent', 'Locked', 'Spent', 'Reverted')
+TX_TYPES = ('ConfirmedCoinbase', 'TxReceived', 'TxSent', 'TxReceivedCancelled',
+            'TxSentCancelled', 'TxReverted')
+UNKNOWN = 255
+
+OUTPUT_DTYPE = np.dtype([
+    ('value', '<u8'),
+    ('height', '<u8'),
+    ('lock_height', '<u8'),
+    ('status', 'u1'),
+    ('is_coinbase', '?'),
+    ('mmr_index', '<i8'),       # -1 when unknown
+    ('tx_log_entry', '<i8'),    # -1 when unknown
+])
+
+TX_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('tx_type', 'u1'),
+    ('confirmed', '?'),
+    ('amount_credited', '<u8'),
+    ('amount_debited', '<u8'),
+    ('fee', '<u8'),
+    ('num_inputs', '<u4'),
+    ('num_outputs', '<u4'),
+    ('output_height', '<i8'),   # -1 when unknown
+    ('creation_ts', 'datetime64[s]'),
+    ('confirmation_ts', 'datetime64[s]'),
+])
+
+_STATUS_CODES = {s: i for i, s in enumerate(OUTPUT_STATUSES)}
+_TX_TYPE_CODES = {t: i for i, t in enumerate(TX_TYPES)}
+
+
+def _or(value, default):
+    return default if value is None else value
+
+def _utc_seconds(value):
+    # Wallet timestamps are UTC RFC3339 strings, the first 19 characters are
+    # what datetime64[s] parses; None becomes NaT
+    return 'NaT' if value is None else value[:19]
+
+
+def outputs_to_array(outputs):
+    '''retrieve_outputs result (dicts or OutputCommit) -> structured array of OUTPUT_DTYPE'''
+    rows = []
+    for output in outputs:
+        if isinstance(output, OutputCommit):
+            rows.append((output.value, output.height, output.lock_height,
+                         _STATUS_CODES.get(output.status, UNKNOWN), output.is_coinbase,
+                         _or(output.mmr_index, -1), _or(output.tx_log_entry, -1)))
+        else:
+            # Read the dict directly, building records first would only cost time
+            output = output.get('output', output)
+            rows.append((int(output['value']), int(output['height']), int(output['lock_height']),
+                         _STATUS_CODES.get(output['status'], UNKNOWN), output['is_coinbase'],
+                         _or(output.get('mmr_index'), -1), _or(output.get('tx_log_entry'), -1)))
+    return np.array(rows, dtype=OUTPUT_DTYPE)
+
+
+def txs_to_array(txs):
+    '''retrieve_txs result (dicts or TxLogEntry) -> structured array of TX_DTYPE'''
+    rows = []
+    for tx in txs:
+        if isinstance(tx, TxLogEntry):
+            tx = tx.raw
+        rows.append((tx['id'], _TX_TYPE_CODES.get(tx['tx_type'], UNKNOWN), tx['confirmed'],
+                     int(_or(tx['amount_credited'], 0)), int(_or(tx['amount_debited'], 0)),
+                     int(_or(tx['fee'], 0)), _or(tx['num_inputs'], 0), _or(tx['num_outputs'], 0),
+                     _or(tx.get('output_height'), -1),
+                     _utc_seconds(tx['creation_ts']), _utc_seconds(tx['confirmation_ts'])))
+    return np.array(rows, dtype=TX_DTYPE)
+
+
+def status_names(codes, names=OUTPUT_STATUSES):
+    '''Decode an array of status or tx type codes back into strings'''
+    lookup = np.array(list(names) + ['Unknown'], dtype=object)
+    codes = np.asarray(codes)
+    return lookup[np.where(codes == UNKNOWN, len(names), codes)]
+
+
+##
+# Output aggregates
+
+def balance_by_status(outputs):
+    '''Sum of output values per status name'''
+    result = {}
+    for code, name in enumerate(OUTPUT_STATUSES):
+        mask = outputs['status'] == code
+        if mask.any():
+            result[name] = int(outputs['value'][mask].sum())
+    return result
+
+
+def balance(outputs, tip_height, minimum_confirmations=1):
+    '''
+    Wallet balance breakdown in the same terms as retrieve_summary_info:
+    spendable, immature (coinbase or lock height not reached), awaiting
+    confirmation and locked.
+    '''
+    values = outputs['value']
+    status = outputs['status']
+    unspent = status == _STATUS_CODES['Unspent']
+    confirmations = confirmation_depths(outputs, tip_height)
+    mature = outputs['lock_height'] <= tip_height
+    confirmed = confirmations >= minimum_confirmations
+    return {
+        'spendable': int(values[unspent & mature & confirmed].sum()),
+        'immature': int(values[unspent & ~mature].sum()),
+        'awaiting_confirmation': int(values[(unspent & mature & ~confirmed)
+                                            | (status == _STATUS_CODES['Unconfirmed'])].sum()),
+        'locked': int(values[status == _STATUS_CODES['Locked']].sum()),
+    }
+
+
+def confirmation_depths(outputs, tip_height):
+    '''Number of confirmations per output, 0 for outputs not on chain'''
+    height = outputs['height'].astype(np.int64)
+    depth = np.int64(tip_height) - height + 1
+    on_chain = (outputs['status'] != _STATUS_CODES['Unconfirmed']) & (height > 0)
+    return np.where(on_chain, np.maximum(depth, 0), 0)
+
+
+def age_histogram(outputs, tip_height, bins=(0, 10, 60, 1440, 10080, 43200), unspent_only=True):
+    '''
+    Histogram of output age in blocks. Returns (counts, values, bin_edges) where
+    counts and values hold the number of outputs and their summed value per bin;
+    the last bin is open ended.
+    '''
+    if unspent_only:
+        outputs = outputs[outputs['status'] == _STATUS_CODES['Unspent']]
+    ages = confirmation_depths(outputs, tip_height)
+    edges = np.asarray(bins, dtype=np.int64)
+    index = np.searchsorted(edges, ages, side='right') - 1
+    index = np.clip(index, 0, len(edges) - 1)
+    counts = np.bincount(index, minlength=len(edges))
+    values = np.zeros(len(edges), dtype=np.uint64)
+    np.add.at(values, index, outputs['value'])
+    return counts, values, edges
+
+
+def confirmation_histogram(outputs, tip_height, max_depth=10):
+    '''Number of outputs per confirmation depth 0..max_depth, the last entry counts deeper ones'''
+    depths = np.minimum(confirmation_depths(outputs, tip_height), max_depth)
+    return np.bincount(depths, minlength=max_depth + 1)
+
+
+def small_outputs(outputs, threshold):
+    '''Mask of unspent outputs worth less than threshold, e.g. consolidation candidates'''
+    return (outputs['status'] == _STATUS_CODES['Unspent']) & (outputs['value'] < threshold)
+
+
+##
+# Transaction aggregates
+
+def fee_total(txs, confirmed_only=True):
+    '''Total fee paid by the wallet (fees are only charged to the sender)'''
+    mask = txs['tx_type'] == _TX_TYPE_CODES['TxSent']
+    if confirmed_only:
+        mask &= txs['confirmed']
+    return int(txs['fee'][mask].sum())
+
+
+def totals_by_type(txs):
+    '''Per tx type: count, credited and debited totals'''
+    result = {}
+    for code, name in enumerate(TX_TYPES):
+        mask = txs['tx_type'] == code
+        count = int(mask.sum())
+        if count:
+            result[name] = {
+                'count': count,
+                'credited': int(txs['amount_credited'][mask].sum()),
+                'debited': int(txs['amount_debited'][mask].sum()),
+            }
+    return result
+
+
+def daily_volume(txs):
+    '''
+    Net amount per day of creation. Returns (days, credited, debited) arrays,
+    days as datetime64[D].
+    '''
+    days = txs['creation_ts'].astype('datetime64[D]')
+    valid = ~np.isnat(days)
+    unique, index = np.unique(days[valid], return_inverse=True)
+    credited = np.zeros(len(unique), dtype=np.uint64)
+    debited = np.zeros(len(unique), dtype=np.uint64)
+    np.add.at(credited, index, txs['amount_credited'][valid])
+    np.add.at(debited, index, txs['amount_debited'][valid])
+    return unique, credited, debited
+
+
+##
+# Optional table views
+
+def to_pandas(array):
+    '''Structured array -> pandas.DataFrame with decoded status / tx type columns'''
+    import pandas as pd
+    frame = pd.DataFrame({name: array[name] for name in array.dtype.names})
+    if 'status' in frame:
+        frame['status'] = pd.Categorical(status_names(array['status'], OUTPUT_STATUSES))
+    if 'tx_type' in frame:
+        frame['tx_type'] = pd.Categorical(status_names(array['tx_type'], TX_TYPES))
+    return frame
+
+
+def to_arrow(array):
+    '''Structured array -> pyarrow.Table, status / tx type as dictionary columns'''
+    import pyarrow as pa
+    columns = {}
+    for name in array.dtype.names:
+        if name == 'status':
+            columns[name] = pa.array(status_names(array[name], OUTPUT_STATUSES)).dictionary_encode()
+        elif name == 'tx_type':
+            columns[name] = pa.array(status_names(array[name], TX_TYPES)).dictionary_encode()
+        else:
+            columns[name] = pa.array(array[name])
+    return pa.table(columns)
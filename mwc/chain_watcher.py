@@ -0,0 +1,246 @@
+# Routines for following the tip of the MWC chain through the node API V2
+#
+# A ChainWatcher polls NodeV2.get_status around the expected block interval and
+# turns tip changes into an ordered stream of events:
+#
+#   new_block  one event per block added to the chain, headers attached
+#   reorg      the chain switched to a fork; blocks above fork_height are gone
+#
+# On a reorg the reorg event comes first, followed by new_block events for
+# every block of the new branch, so consumers can roll back to fork_height and
+# then replay forward.
+#
+# Events reach every subscriber in order. A subscriber that raises keeps its
+# undelivered events, starting with the one that failed, and gets them again
+# on the next poll; the other subscribers and the returned events are not
+# affected. Errors are reported to on_error(exception, event, callback).
+#
+
+import asyncio, time
+from collections import OrderedDict, deque
+
+from mwc.node_v2 import NodeError
+
+# MWC targets one block per minute
+BLOCK_TIME = 60
+
+
+class ChainEvent:
+    NEW_BLOCK = 'new_block'
+    REORG = 'reorg'
+
+    def __init__(self, kind, height, header=None, depth=0, fork_height=None, detached=None):
+        self.kind = kind
+        self.height = height            # new_block: block height, reorg: new tip height
+        self.header = header            # new_block: the block header
+        self.depth = depth              # reorg: number of blocks detached from our chain
+        self.fork_height = fork_height  # reorg: height of the last common block
+        self.detached = detached or []  # reorg: headers of the detached blocks, lowest first
+
+    @property
+    def hash(self):
+        if self.header is None:
+            return None
+        return self.header['hash']
+
+    def __repr__(self):
+        if self.kind == ChainEvent.REORG:
+            return f'ChainEvent(reorg, depth={self.depth}, fork_height={self.fork_height})'
+        return f'ChainEvent(new_block, height={self.height}, hash={self.hash})'
+
+
+def _retried(errors):
+    # Default errors of a poll worth retrying. requests is only imported here,
+    # so importing this module stays cheap
+    if errors is not None:
+        return errors
+    try:
+        import requests
+    except ImportError:
+        return (NodeError,)
+    return (NodeError, requests.RequestException)
+
+
+class ChainWatcher:
+    def __init__(self, node, block_time=BLOCK_TIME, min_interval=1.0, max_interval=None,
+                 start_height=None, max_reorg_depth=100, on_error=None):
+        '''
+        node: NodeV2 instance
+        block_time: expected seconds between blocks, polling tightens around it
+        min_interval: lower bound for every delay between polls
+        max_interval: upper bound for the delay once the next block is due;
+            right after a block polls may be up to block_time / 2 apart
+        start_height: emit new_block events from start_height + 1 on the first poll,
+            by default the first poll only records the current tip
+        max_reorg_depth: number of recent headers kept for fork detection
+        on_error: optional on_error(exception, event, callback) for subscriber
+            errors and for node and transport errors swallowed by events()
+            (event and callback None)
+        '''
+        self.node = node
+        self.block_time = block_time
+        self.min_interval = min_interval
+        self.max_interval = max_interval if max_interval is not None else block_time / 4
+        self.start_height = start_height
+        self.max_reorg_depth = max_reorg_depth
+
+        self.headers = OrderedDict()    # height -> header of our view of the chain
+        self.last_block_seen = None     # monotonic time a new tip was last observed
+        self.misses = 0                 # polls since then that found nothing new
+        self.subscribers = []
+        self.backlog = {}               # subscriber -> events still to deliver to it
+        self.on_error = on_error
+
+    @property
+    def tip(self):
+        if not self.headers:
+            return None
+        return next(reversed(self.headers.values()))
+
+    @property
+    def height(self):
+        tip = self.tip
+        return tip['height'] if tip is not None else None
+
+    def subscribe(self, callback):
+        '''Call callback(event) for every event produced by poll()'''
+        self.subscribers.append(callback)
+        self.backlog[callback] = deque()
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+        self.backlog.pop(callback, None)
+
+    def _deliver(self, events):
+        for callback in list(self.subscribers):
+            queue = self.backlog[callback]
+            queue.extend(events)
+            while queue:
+                try:
+                    callback(queue[0])
+                except Exception as e:
+                    # Retried from this event on the next poll
+                    self._report(e, queue[0], callback)
+                    break
+                queue.popleft()
+
+    def _report(self, exception, event=None, callback=None):
+        if self.on_error is not None:
+            self.on_error(exception, event, callback)
+
+    def poll(self):
+        '''
+        Check the node tip once and return the list of new events, in order.
+        '''
+        status = self.node.get_status()
+        tip_hash = status['tip']['last_block_pushed']
+        tip_height = status['tip']['height']
+
+        now = time.monotonic()
+        tip = self.tip
+        if tip is not None and tip['hash'] == tip_hash:
+            self.misses += 1
+            self._deliver([])
+            return []
+
+        if tip is None and self.start_height is None:
+            # First poll, nothing to compare against yet
+            self._append(self.node.get_header(hash_=tip_hash))
+            self.last_block_seen = now
+            self.misses = 0
+            return []
+
+        events = self._advance(tip_hash, tip_height)
+        self.last_block_seen = now
+        self.misses = 0
+        self._deliver(events)
+        return events
+
+    def _advance(self, tip_hash, tip_height):
+        # Walk back from the new tip by hash until we hit a block we already know
+        branch = [self.node.get_header(hash_=tip_hash)]
+        lowest = next(iter(self.headers)) if self.headers else self.start_height + 1
+        fork_height = None
+        while True:
+            header = branch[-1]
+            parent_height = header['height'] - 1
+            known = self.headers.get(parent_height)
+            if known is not None and known['hash'] == header['previous']:
+                fork_height = parent_height
+                break
+            if parent_height < lowest:
+                # Past everything we remember (or the requested start): treat it as the fork point
+                fork_height = parent_height
+                break
+            branch.append(self.node.get_header(hash_=header['previous']))
+        branch.reverse()
+
+        events = []
+        detached = [h for height, h in self.headers.items() if height > fork_height]
+        if detached:
+            for header in detached:
+                del self.headers[header['height']]
+            events.append(ChainEvent(ChainEvent.REORG, tip_height, depth=len(detached),
+                                     fork_height=fork_height, detached=detached))
+        for header in branch:
+            self._append(header)
+            events.append(ChainEvent(ChainEvent.NEW_BLOCK, header['height'], header=header))
+        return events
+
+    def _append(self, header):
+        self.headers[header['height']] = header
+        while len(self.headers) > self.max_reorg_depth:
+            self.headers.popitem(last=False)
+
+    def next_delay(self):
+        '''
+        Seconds to wait before the next poll. Polls are sparse right after a new
+        block and get tighter as the next block becomes due; once it is overdue
+        the delay backs off again up to max_interval.
+        '''
+        if self.last_block_seen is None:
+            return self.min_interval
+        remaining = self.last_block_seen + self.block_time - time.monotonic()
+        if remaining > 2 * self.min_interval:
+            return max(self.min_interval, remaining / 2)
+        overdue = self.min_interval * (1 + self.misses // 2)
+        return max(self.min_interval, min(self.max_interval, overdue))
+
+    def events(self, errors=None):
+        '''
+        Blocking generator of ChainEvent objects. Errors listed in errors, by
+        default node errors and requests connection errors and timeouts, are
+        swallowed and the poll is retried after the next delay.
+        '''
+        errors = _retried(errors)
+        while True:
+            try:
+                for event in self.poll():
+                    yield event
+            except errors as e:
+                self.misses += 1
+                self._report(e)
+            time.sleep(self.next_delay())
+
+    def __iter__(self):
+        return self.events()
+
+    async def aevents(self, errors=None):
+        '''
+        Async generator of ChainEvent objects; polls run in the default executor.
+        errors are retried as in events().
+        '''
+        errors = _retried(errors)
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                for event in await loop.run_in_executor(None, self.poll):
+                    yield event
+            except errors as e:
+                self.misses += 1
+                self._report(e)
+            await asyncio.sleep(self.next_delay())
+
+    def __aiter__(self):
+        return self.aevents()
@@ -0,0 +1,510 @@
+# mwcmw: command line tool for bulk node and wallet operations
+#
+#   mwcmw blocks export [--from H] [--to H] [--format jsonl|csv|parquet] [--output PATH]
+#   mwcmw kernels check FILE [--min-height H] [--max-height H]
+#   mwcmw wallet txs [--account A ...] [--since ID] [--stream]
+#   mwcmw payouts run CSV [--journal PATH] [--dry-run]
+#
+# Every command takes -c/--concurrency for the number of calls in flight,
+# --rate to cap calls per second and --adaptive to let mwc.limits find the
+# concurrency the endpoint sustains. Results go to stdout as JSON Lines, one
+# record per line as soon as it is ready; a throughput and latency summary
+# goes to stderr at the end.
+#
+# Credentials come from an INI file (--config, $MWCMW_CONFIG or ~/.mwcmw.ini)
+# with [node] and [wallet] sections, every key can be overridden by an
+# environment variable MWCMW_<SECTION>_<KEY>, e.g. MWCMW_WALLET_PASSWORD:
+#
+#   [node]
+#   foreign_url = http://localhost:3413/v2/foreign
+#   owner_url = http://localhost:3413/v2/owner
+#   user = mwcmain
+#   secret_file = ~/.mwc/main/.api_secret
+#   foreign_secret_file = ~/.mwc/main/.foreign_api_secret
+#
+#   [wallet]
+#   url = http://localhost:3420/v3/owner
+#   user = mwc
+#   secret_file = ~/.mwc/main/.owner_api_secret
+#   name =
+#   password = ...          # wallet password, asked for on the terminal when missing
+#
+# API secrets may be given directly instead of through secret files: the node
+# ones as password / foreign_password, the wallet owner API one as
+# api_password. The node owner secret is only read by commands that call the
+# node owner API (blocks export without --to).
+#
+
+import argparse, configparser, csv, getpass, json, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from mwc.export import BLOCK_FIELDS, Writer, HighWaterMarks, export_blocks, open_writer
+from mwc.limits import limit
+from mwc.node_v2 import NodeV2, NodeError
+from mwc.payment_proofs import bounded_map
+from mwc.transport import HttpTransport
+from mwc.wallet_manager import WalletManager, DEFAULT_ACCOUNT
+from mwc.wallet_v3 import WalletError
+
+DEFAULTS = {
+    'node': {
+        'foreign_url': 'http://localhost:3413/v2/foreign',
+        'owner_url': 'http://localhost:3413/v2/owner',
+        'user': 'mwcmain',
+        'secret_file': '~/.mwc/main/.api_secret',
+        'foreign_secret_file': '~/.mwc/main/.foreign_api_secret',
+    },
+    'wallet': {
+        'url': 'http://localhost:3420/v3/owner',
+        'user': 'mwc',
+        'secret_file': '~/.mwc/main/.owner_api_secret',
+        'name': '',
+    },
+}
+
+NANO_MWC = 1000000000
+
+
+class ConfigError(Exception):
+    pass
+
+
+class Config:
+    def __init__(self, path=None):
+        self.parser = configparser.ConfigParser(interpolation=None)
+        self.parser.read_dict(DEFAULTS)
+        path = path or os.environ.get('MWCMW_CONFIG') or os.path.expanduser('~/.mwcmw.ini')
+        if os.path.exists(path):
+            self.parser.read(path)
+
+    def get(self, section, key):
+        value = os.environ.get(f'MWCMW_{section}_{key}'.upper())
+        if value is None:
+            value = self.parser.get(section, key, fallback=None)
+        return value or None
+
+    def secret(self, section, key='password', file_key='secret_file', prompt=None):
+        '''A password given directly, read from its secret file, or asked for'''
+        value = self.get(section, key)
+        if value is not None:
+            return value
+        path = self.get(section, file_key) if file_key else None
+        if path is not None and os.path.exists(os.path.expanduser(path)):
+            with open(os.path.expanduser(path)) as f:
+                return f.read().strip()
+        if prompt is not None and sys.stdin.isatty():
+            return getpass.getpass(prompt)
+        name = f'MWCMW_{section}_{key}'.upper()
+        where = f'{key} or {file_key}' if file_key else key
+        raise ConfigError(f'No {key} for [{section}], set {where} in the config or {name}')
+
+
+class TimedTransport:
+    '''Transport wrapper keeping the latency of every call for the summary'''
+    def __init__(self, inner):
+        self.inner = inner
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def post(self, url, payload, auth, secret=None):
+        start = time.monotonic()
+        ok = False
+        try:
+            response = self.inner.post(url, payload, auth, secret)
+            ok = 200 <= response.status_code < 300
+            return response
+        finally:
+            with self.lock:
+                self.latencies.append(time.monotonic() - start)
+                if not ok:
+                    self.errors += 1
+
+    def close(self):
+        self.inner.close()
+
+
+class Output:
+    '''JSON Lines on stdout, shared by worker threads'''
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def emit(self, record):
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        with self.lock:
+            self.stream.write(line)
+            self.stream.flush()
+            self.count += 1
+
+
+class _OutputWriter(Writer):
+    # mwc.export writer sending rows to the Output
+    def __init__(self, output, fields):
+        super().__init__('-', fields)
+        self.output = output
+
+    def write(self, record):
+        self.output.emit({f: record.get(f) for f in self.fields})
+        self.count += 1
+
+
+def summary(command, records, elapsed, timed):
+    latencies = sorted(timed.latencies)
+    line = (f'mwcmw {command}: {records} records in {elapsed:.2f}s '
+            f'({records / elapsed if elapsed else 0:.1f}/s), {len(latencies)} calls, {timed.errors} errors')
+    if latencies:
+        line += (f', latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms'
+                 f' p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms'
+                 f' max {latencies[-1] * 1000:.1f} ms')
+    print(line, file=sys.stderr)
+
+
+def http_transport(concurrency):
+    '''HttpTransport over a session pooling as many connections as calls in flight'''
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(10, concurrency))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return HttpTransport(session)
+
+
+def _limited(client, args):
+    if args.rate is not None or args.adaptive:
+        limit(client, rate=args.rate, adaptive=args.adaptive)
+    return client
+
+
+class _Node(NodeV2):
+    # NodeV2 reading the owner secret on the first owner API call, so foreign
+    # API only commands work without it
+    def __init__(self, config, transport):
+        super().__init__(
+            config.get('node', 'foreign_url'), config.get('node', 'user'),
+            config.secret('node', 'foreign_password', 'foreign_secret_file'),
+            config.get('node', 'owner_url'), config.get('node', 'user'), None,
+            transport=transport)
+        self.config = config
+
+    def post(self, method, params, api_type):
+        if api_type == 'owner' and self.owner_api_password is None:
+            self.owner_api_password = self.config.secret('node')
+        return super().post(method, params, api_type)
+
+
+def make_node(config, args, timed):
+    return _limited(_Node(config, timed), args)
+
+
+def make_wallet_manager(config, args, timed):
+    url = config.get('wallet', 'url')
+    name = config.get('wallet', 'name')
+    manager = _limited(WalletManager(transport=timed), args)
+    manager.add_endpoint(url, config.get('wallet', 'user'), config.secret('wallet', 'api_password'))
+    manager.add_wallet(url, name, config.secret('wallet', 'password', None, prompt='Wallet password: '))
+    return manager, url, name
+
+
+# blocks export
+
+def blocks_export(config, args, output, timed):
+    node = make_node(config, args, timed)
+    end_height = args.to
+    if end_height is None:
+        end_height = node.get_status()['tip']['height']
+    marks = HighWaterMarks(args.state) if args.state else None
+    if args.output == '-':
+        if args.format != 'jsonl':
+            raise ConfigError('Only jsonl can be written to stdout, use --output')
+        writer = _OutputWriter(output, BLOCK_FIELDS)
+    else:
+        writer = open_writer(args.format, args.output, BLOCK_FIELDS, append=marks is not None)
+    with writer:
+        written = export_blocks(node, writer, marks, start_height=args.start, end_height=end_height,
+                                concurrency=args.concurrency)
+    return written, 0
+
+
+# kernels check
+
+def _read_kernels(path):
+    f = sys.stdin if path == '-' else open(path)
+    try:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line.split(',')[0].strip()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def kernels_check(config, args, output, timed):
+    node = make_node(config, args, timed)
+
+    def check(excess):
+        record = {'excess': excess, 'found': False, 'height': None, 'mmr_index': None}
+        try:
+            kernel = node.get_kernel(excess, args.min_height, args.max_height)
+        except NodeError as e:
+            record['error'] = str(e.reason)
+            return record
+        if kernel is not None:
+            record.update(found=True, height=kernel.get('height'), mmr_index=kernel.get('mmr_index'))
+        return record
+
+    missing = 0
+    for record in bounded_map(check, _read_kernels(args.file), args.concurrency):
+        output.emit(record)
+        if not record['found']:
+            missing += 1
+    return output.count, 1 if missing else 0
+
+
+# wallet txs
+
+def wallet_txs(config, args, output, timed):
+    manager, url, name = make_wallet_manager(config, args, timed)
+    accounts = args.account or [DEFAULT_ACCOUNT]
+    sessions = [manager.session(url, name, account) for account in accounts]
+    seen = {}                   # (account, id) -> (confirmed, tx_type) last emitted
+
+    def fetch(session):
+        return session, session.retrieve_txs(refresh=not args.no_refresh)
+
+    def emit_changes(pool):
+        for session, txs in pool.map(fetch, sessions):
+            for tx in txs:
+                if args.since is not None and tx['id'] <= args.since:
+                    continue
+                key = (session.account, tx['id'])
+                state = (tx.get('confirmed'), tx.get('tx_type'))
+                if seen.get(key) == state:
+                    continue
+                seen[key] = state
+                output.emit(dict(tx, account=session.account))
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            emit_changes(pool)
+            if not args.stream:
+                return output.count, 0
+            # Follow the wallet: look again whenever its node height moves
+            height = sessions[0].node_height()['height']
+            while True:
+                time.sleep(args.interval)
+                current = sessions[0].node_height()['height']
+                if current != height:
+                    height = current
+                    emit_changes(pool)
+    except KeyboardInterrupt:
+        return output.count, 0
+    finally:
+        manager.close()
+
+
+# payouts run
+
+def read_payouts(path):
+    '''Rows of id, address, amount (MWC) and optional proof_address'''
+    payouts = []
+    with open(path, newline='') as f:
+        for number, row in enumerate(csv.DictReader(f), start=1):
+            try:
+                amount = int(Decimal(row['amount']) * NANO_MWC)
+            except (KeyError, TypeError, ArithmeticError) as e:
+                raise ConfigError(f'{path} row {number}: invalid amount') from e
+            if amount <= 0:
+                raise ConfigError(f'{path} row {number}: amount must be positive')
+            if not row.get('address'):
+                raise ConfigError(f'{path} row {number}: missing address')
+            payouts.append({
+                'id': row.get('id') or str(number),
+                'address': row['address'],
+                'amount': amount,
+                'proof_address': row.get('proof_address') or None,
+            })
+    ids = [p['id'] for p in payouts]
+    if len(set(ids)) != len(ids):
+        raise ConfigError(f'{path}: payout ids are not unique')
+    return payouts
+
+
+def _refused(error):
+    '''
+    True when the wallet answered the call with a JSON-RPC error, i.e. it
+    refused to send. HTTP level errors carry the (positive) status code; a
+    502/504 from a proxy can come after the wallet already sent the tx.
+    '''
+    return not (isinstance(error.code, int) and error.code > 0)
+
+
+def _journal_done(path):
+    # id -> status of payouts that must not be sent again: sent, or unknown
+    # when the call broke off and the wallet may have sent it anyway
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry.get('status') in ('sent', 'unknown'):
+                        done[entry['id']] = entry['status']
+    return done
+
+
+def payouts_run(config, args, output, timed):
+    payouts = read_payouts(args.file)
+    journal_path = args.journal or args.file + '.journal'
+    done = _journal_done(journal_path)
+
+    if args.dry_run:
+        for payout in payouts:
+            status = 'skipped' if payout['id'] in done else 'planned'
+            output.emit(dict(payout, status=status, previous=done.get(payout['id'])))
+        return output.count, 0
+
+    manager, url, name = make_wallet_manager(config, args, timed)
+    session = manager.session(url, name, args.account or DEFAULT_ACCOUNT)
+    journal = open(journal_path, 'a')
+    journal_lock = threading.Lock()
+
+    def send(payout):
+        result = dict(payout, status='failed', tx_slate_id=None, error=None)
+        tx_args = {
+            'src_acct_name': None,
+            'amount': payout['amount'],
+            'minimum_confirmations': args.minimum_confirmations,
+            'max_outputs': 500,
+            'num_change_outputs': 1,
+            'selection_strategy_is_use_all': False,
+            'target_slate_version': None,
+            'payment_proof_recipient_address': payout['proof_address'],
+            'ttl_blocks': args.ttl_blocks,
+            'send_args': {
+                'dest': payout['address'],
+                'post_tx': True,
+                'fluff': args.fluff,
+                'skip_tor': False,
+            },
+        }
+        try:
+            slate = session.init_send_tx(tx_args)
+            result.update(status='sent', tx_slate_id=slate['id'])
+        except WalletError as e:
+            # Refused by the wallet, nothing was sent and a rerun tries again;
+            # an HTTP error leaves it open whether the wallet sent it
+            result['error'] = str(e.reason)
+            if not _refused(e):
+                result['status'] = 'unknown'
+        except Exception as e:
+            result.update(status='unknown', error=str(e))
+        # Journal every outcome before reporting it, a rerun skips what was sent
+        with journal_lock:
+            journal.write(json.dumps(result) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        return result
+
+    failed = 0
+    try:
+        for payout in payouts:
+            if payout['id'] in done:
+                output.emit(dict(payout, status='skipped', previous=done[payout['id']]))
+        pending = [p for p in payouts if p['id'] not in done]
+        for result in bounded_map(send, pending, args.concurrency):
+            output.emit(result)
+            if result['status'] != 'sent':
+                failed += 1
+    finally:
+        journal.close()
+        manager.close()
+    return output.count, 1 if failed else 0
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--config', help='INI file with [node] and [wallet] sections')
+    common.add_argument('-c', '--concurrency', type=int, default=4, help='calls in flight (default 4)')
+    common.add_argument('--rate', type=float, help='maximum calls per second')
+    common.add_argument('--adaptive', action='store_true',
+                        help='lower the calls in flight while the endpoint latency is high')
+    common.add_argument('-q', '--quiet', action='store_true', help='no summary on stderr')
+
+    parser = argparse.ArgumentParser(prog='mwcmw', description='Bulk MWC node and wallet operations')
+    groups = parser.add_subparsers(dest='group', metavar='{blocks,kernels,wallet,payouts}')
+    groups.required = True
+
+    blocks = groups.add_parser('blocks', help='chain data').add_subparsers(dest='command')
+    blocks.required = True
+    p = blocks.add_parser('export', parents=[common], help='export one record per block')
+    p.add_argument('--from', dest='start', type=int, default=0, help='first height (default 0)')
+    p.add_argument('--to', type=int, help='last height (default the tip)')
+    p.add_argument('--format', choices=('jsonl', 'csv', 'parquet'), default='jsonl')
+    p.add_argument('--output', default='-', help='file or parquet directory (default stdout)')
+    p.add_argument('--state', help='high-water mark file, continue from the last exported block')
+    p.set_defaults(func=blocks_export)
+
+    kernels = groups.add_parser('kernels', help='kernel lookups').add_subparsers(dest='command')
+    kernels.required = True
+    p = kernels.add_parser('check', parents=[common],
+                           help='look up kernel excesses, one per line; exit 1 if any is missing')
+    p.add_argument('file', help="file with kernel excesses, '-' for stdin")
+    p.add_argument('--min-height', type=int)
+    p.add_argument('--max-height', type=int)
+    p.set_defaults(func=kernels_check)
+
+    wallet = groups.add_parser('wallet', help='wallet history').add_subparsers(dest='command')
+    wallet.required = True
+    p = wallet.add_parser('txs', parents=[common], help='tx log entries')
+    p.add_argument('--account', action='append', help='account label, may be repeated')
+    p.add_argument('--since', type=int, help='only entries with a larger id')
+    p.add_argument('--no-refresh', action='store_true', help='do not refresh from the node first')
+    p.add_argument('--stream', action='store_true', help='keep running and emit new or changed entries')
+    p.add_argument('--interval', type=float, default=15, help='seconds between polls with --stream')
+    p.set_defaults(func=wallet_txs)
+
+    payouts = groups.add_parser('payouts', help='bulk sends').add_subparsers(dest='command')
+    payouts.required = True
+    p = payouts.add_parser('run', parents=[common],
+                           help='send the payouts of a CSV with id,address,amount[,proof_address] columns')
+    p.add_argument('file')
+    p.add_argument('--journal', help='record of sent payouts, default FILE.journal')
+    p.add_argument('--dry-run', action='store_true', help='only list what would be sent')
+    p.add_argument('--account', help='account to send from')
+    p.add_argument('--minimum-confirmations', type=int, default=10)
+    p.add_argument('--ttl-blocks', type=int)
+    p.add_argument('--fluff', action='store_true')
+    p.set_defaults(func=payouts_run)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    command = f'{args.group} {args.command}'
+    config = Config(args.config)
+    output = Output()
+    timed = TimedTransport(http_transport(args.concurrency))
+    start = time.monotonic()
+    try:
+        records, status = args.func(config, args, output, timed)
+    except ConfigError as e:
+        print(f'mwcmw: error: {e}', file=sys.stderr)
+        return 2
+    except (NodeError, WalletError) as e:
+        print(f'mwcmw: {e}', file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # Output closed early, e.g. piped into head
+        sys.stderr.close()
+        return 0
+    if not args.quiet:
+        summary(command, records, time.monotonic() - start, timed)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# Routines for tracking kernel confirmations driven by new blocks
+#
+# Instead of calling NodeV2.get_kernel for every pending kernel on every poll,
+# a ConfirmationTracker listens to ChainWatcher events, fetches each new block
+# once with NodeV2.get_block and matches its kernels against the pending set.
+# Node load scales with the block rate, not with the number of pending kernels.
+#
+
+import heapq, threading
+
+
+class ConfirmationTracker:
+    def __init__(self, node, watcher=None, on_confirmed=None):
+        '''
+        node: NodeV2 instance used to fetch blocks
+        watcher: optional ChainWatcher, the tracker subscribes to its events
+        on_confirmed: default callback(excess, height, confirmations)
+        '''
+        self.node = node
+        self.on_confirmed = on_confirmed
+        self.tip_height = None
+
+        self.pending = {}       # excess -> [confirmations, callback, height or None]
+        self.included = {}      # height -> set of excesses included at that height
+        self.due = []           # heap of (confirmed at height, included at height, excess)
+        self.lock = threading.RLock()
+
+        self.watcher = watcher
+        if watcher is not None:
+            watcher.subscribe(self.handle_event)
+            self.tip_height = watcher.height
+
+    def track(self, excess, confirmations=10, callback=None, min_height=None):
+        '''
+        Start tracking a kernel excess until it has the required confirmations.
+
+        If min_height is given the kernel may already be on chain, so a single
+        get_kernel lookup from min_height is done to catch it up; otherwise the
+        kernel is only looked for in blocks that arrive from now on.
+        '''
+        with self.lock:
+            self.pending[excess] = [confirmations, callback, None]
+        if min_height is not None:
+            found = self.node.get_kernel(excess, min_height, None)
+            if found is not None:
+                with self.lock:
+                    # add_block may have included it while get_kernel ran
+                    entry = self.pending.get(excess)
+                    if entry is not None and entry[2] is None:
+                        self._include(excess, found['height'])
+                    fired = self._pop_due()
+                self._notify(fired)
+
+    def untrack(self, excess):
+        with self.lock:
+            entry = self.pending.pop(excess, None)
+            if entry is not None and entry[2] is not None:
+                self.included[entry[2]].discard(excess)
+                if not self.included[entry[2]]:
+                    del self.included[entry[2]]
+
+    def confirmations(self, excess):
+        '''Current number of confirmations, 0 if the kernel is not on chain yet'''
+        with self.lock:
+            entry = self.pending.get(excess)
+            if entry is None or entry[2] is None or self.tip_height is None:
+                return 0
+            return self.tip_height - entry[2] + 1
+
+    def handle_event(self, event):
+        if event.kind == event.REORG:
+            self.rollback(event.fork_height)
+        else:
+            self.add_block(event.height, event.hash)
+
+    def add_block(self, height, hash_=None):
+        '''Fetch one new block and match its kernels against the pending set'''
+        if hash_ is not None:
+            block = self.node.get_block(hash_=hash_)
+        else:
+            block = self.node.get_block(height=height)
+        with self.lock:
+            pending = self.pending
+            for kernel in block['kernels']:
+                excess = kernel['excess']
+                if excess in pending and pending[excess][2] is None:
+                    self._include(excess, height)
+            self.tip_height = height
+            fired = self._pop_due()
+        self._notify(fired)
+
+    def rollback(self, fork_height):
+        '''
+        Forget inclusions above fork_height. The kernels go back to pending and
+        are matched again when the blocks of the new branch arrive.
+        '''
+        with self.lock:
+            for height in [h for h in self.included if h > fork_height]:
+                for excess in self.included.pop(height):
+                    entry = self.pending.get(excess)
+                    if entry is not None:
+                        entry[2] = None
+            # Stale heap items are skipped in _pop_due
+            self.tip_height = fork_height
+
+    def _include(self, excess, height):
+        entry = self.pending[excess]
+        entry[2] = height
+        self.included.setdefault(height, set()).add(excess)
+        heapq.heappush(self.due, (height + entry[0] - 1, height, excess))
+
+    def _pop_due(self):
+        fired = []
+        while self.due and self.tip_height is not None and self.due[0][0] <= self.tip_height:
+            _, height, excess = heapq.heappop(self.due)
+            entry = self.pending.get(excess)
+            if entry is None or entry[2] != height:
+                # Untracked or rolled back since it was queued
+                continue
+            del self.pending[excess]
+            self.included[height].discard(excess)
+            if not self.included[height]:
+                del self.included[height]
+            fired.append((entry[1] or self.on_confirmed, excess, height, self.tip_height - height + 1))
+        return fired
+
+    def _notify(self, fired):
+        # Callbacks run outside the lock so they may track or untrack kernels
+        for callback, excess, height, confirmations in fired:
+            if callback is not None:
+                callback(excess, height, confirmations)
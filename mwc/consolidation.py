@@ -0,0 +1,313 @@
+# Routines for consolidating many small wallet outputs into a few large ones
+#
+# A hot wallet that receives many payments ends up with thousands of small
+# outputs, which slows down coin selection in init_send_tx and grows slates.
+# The planner groups unspent outputs into self-spends that stay under the
+# input limit, the executor runs them (optionally only inside low-traffic
+# windows, with bounded concurrency) and waits for their confirmation, and the
+# report compares output count and send latency before and after.
+#
+# usage:
+#   planner = ConsolidationPlanner(max_inputs=400, dust_threshold=1000000000)
+#   batches = planner.plan(wallet.retrieve_outputs(), wallet.node_height()['height'])
+#   executor = ConsolidationExecutor(wallet, 'http://localhost:3415', windows=[(1, 5)])
+#   report = executor.run(batches)
+#   print(report.summary())
+#
+
+import datetime, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from mwc.models import OutputCommit
+from mwc.wallet_v3 import WalletError
+
+# mwc fee rule: (4 * outputs + kernels - inputs) * base fee, at least one base fee
+BASE_FEE = 1000000
+
+
+def tx_fee(num_inputs, num_outputs=1, num_kernels=1, base_fee=BASE_FEE):
+    return max(1, 4 * num_outputs + num_kernels - num_inputs) * base_fee
+
+
+class ConsolidationBatch:
+    PLANNED = 'planned'
+    SENT = 'sent'
+    CONFIRMED = 'confirmed'
+    FAILED = 'failed'
+    UNKNOWN = 'unknown'         # the send broke off, the tx may or may not have been posted
+
+    def __init__(self, inputs, fee):
+        self.inputs = inputs            # list of OutputCommit
+        self.fee = fee
+        self.amount = sum(o.value for o in inputs) - fee
+        self.status = ConsolidationBatch.PLANNED
+        self.slate_id = None
+        self.kernel_excess = None
+        self.error = None
+        self.sent_at = None
+        self.sent_height = None         # node height just before sending, the tx is mined above it
+        self.confirmed_at = None
+
+    @property
+    def commits(self):
+        return [o.commit for o in self.inputs]
+
+    def __repr__(self):
+        return f'ConsolidationBatch({len(self.inputs)} inputs, amount={self.amount}, status={self.status})'
+
+
+class ConsolidationPlanner:
+    def __init__(self, max_inputs=400, min_inputs=10, dust_threshold=None,
+                 minimum_confirmations=10, max_batches=None, base_fee=BASE_FEE):
+        '''
+        max_inputs: inputs per self-spend, keep it below the wallet max_outputs limit
+        min_inputs: do not bother with batches smaller than this
+        dust_threshold: only consolidate outputs worth less than this (nano MWC)
+        minimum_confirmations: only use outputs with at least this many confirmations
+        max_batches: cap the number of self-spends per plan
+        '''
+        self.max_inputs = max_inputs
+        self.min_inputs = min_inputs
+        self.dust_threshold = dust_threshold
+        self.minimum_confirmations = minimum_confirmations
+        self.max_batches = max_batches
+        self.base_fee = base_fee
+
+    def candidates(self, outputs, tip_height):
+        '''Spendable outputs eligible for consolidation, smallest first'''
+        result = []
+        for output in outputs:
+            if not isinstance(output, OutputCommit):
+                output = OutputCommit.from_api(output)
+            if not output.is_spendable(tip_height, self.minimum_confirmations):
+                continue
+            if self.dust_threshold is not None and output.value >= self.dust_threshold:
+                continue
+            result.append(output)
+        result.sort(key=lambda o: o.value)
+        return result
+
+    def plan(self, outputs, tip_height):
+        '''
+        Split the candidates into batches of at most max_inputs. Batches whose
+        value does not cover the fee are dropped.
+        '''
+        candidates = self.candidates(outputs, tip_height)
+        batches = []
+        for start in range(0, len(candidates), self.max_inputs):
+            inputs = candidates[start:start + self.max_inputs]
+            if len(inputs) < self.min_inputs:
+                break
+            fee = tx_fee(len(inputs), base_fee=self.base_fee)
+            batch = ConsolidationBatch(inputs, fee)
+            if batch.amount <= 0:
+                continue
+            batches.append(batch)
+            if self.max_batches is not None and len(batches) >= self.max_batches:
+                break
+        return batches
+
+
+def in_windows(windows, now=None):
+    '''
+    True when now (local time) falls into one of the (start_hour, end_hour)
+    windows; a window may wrap around midnight, e.g. (22, 4).
+    '''
+    if not windows:
+        return True
+    now = now or datetime.datetime.now()
+    hour = now.hour + now.minute / 60.0
+    for start, end in windows:
+        if start <= end and start <= hour < end:
+            return True
+        if start > end and (hour >= start or hour < end):
+            return True
+    return False
+
+
+def measure_send_latency(wallet, amount, samples=3, max_outputs=500):
+    '''
+    Median seconds taken by an estimate-only init_send_tx for amount, i.e.
+    the coin selection cost without locking or sending anything.
+    '''
+    args = {
+        'src_acct_name': None,
+        'amount': int(amount),
+        'minimum_confirmations': 1,
+        'max_outputs': max_outputs,
+        'num_change_outputs': 1,
+        'selection_strategy_is_use_all': False,
+        'estimate_only': True,
+        'send_args': None,
+    }
+    timings = []
+    for _ in range(samples):
+        start = time.monotonic()
+        wallet.init_send_tx(args)
+        timings.append(time.monotonic() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+class ConsolidationReport:
+    def __init__(self, batches, outputs_before, outputs_after, latency_before=None, latency_after=None):
+        self.batches = batches
+        self.outputs_before = outputs_before
+        self.outputs_after = outputs_after
+        self.latency_before = latency_before
+        self.latency_after = latency_after
+
+    def count(self, status):
+        return sum(1 for b in self.batches if b.status == status)
+
+    @property
+    def fees(self):
+        return sum(b.fee for b in self.batches if b.status in (ConsolidationBatch.SENT, ConsolidationBatch.CONFIRMED))
+
+    def summary(self):
+        lines = [
+            f'batches: {len(self.batches)} planned, {self.count(ConsolidationBatch.CONFIRMED)} confirmed, '
+            f'{self.count(ConsolidationBatch.SENT)} unconfirmed, {self.count(ConsolidationBatch.FAILED)} failed, '
+            f'{self.count(ConsolidationBatch.UNKNOWN)} unknown',
+            f'unspent outputs: {self.outputs_before} -> {self.outputs_after}',
+            f'fees paid: {self.fees / 1e9:.9f} MWC',
+        ]
+        if self.latency_before is not None and self.latency_after is not None:
+            lines.append(f'init_send_tx latency: {self.latency_before * 1000:.1f} ms -> {self.latency_after * 1000:.1f} ms')
+        return '\n'.join(lines)
+
+
+class ConsolidationExecutor:
+    def __init__(self, wallet, self_dest, windows=None, concurrency=1, confirmations=10,
+                 tracker=None, poll_interval=60, fluff=True, latency_amount=None):
+        '''
+        wallet: opened WalletV3
+        self_dest: where the wallet sends to itself, e.g. its own foreign API
+            listener 'http://localhost:3415' or its slatepack address
+        windows: list of (start_hour, end_hour) low-traffic windows, None for any time
+        concurrency: self-spends in flight at the same time; batches never share inputs
+        confirmations: confirmations to wait for before a batch counts as done
+        tracker: optional ConfirmationTracker, otherwise retrieve_txs is polled
+        latency_amount: if set, measure init_send_tx latency for this amount
+            before and after consolidating
+        '''
+        self.wallet = wallet
+        self.self_dest = self_dest
+        self.windows = windows
+        self.concurrency = concurrency
+        self.confirmations = confirmations
+        self.tracker = tracker
+        self.poll_interval = poll_interval
+        self.fluff = fluff
+        self.latency_amount = latency_amount
+
+    def wait_for_window(self):
+        while not in_windows(self.windows):
+            time.sleep(self.poll_interval)
+
+    def send(self, batch):
+        '''Self-spend exactly the batch inputs into a single output'''
+        self.wait_for_window()
+        args = {
+            'src_acct_name': None,
+            'amount': batch.amount,
+            'minimum_confirmations': 1,
+            'max_outputs': len(batch.inputs),
+            'num_change_outputs': 1,
+            'selection_strategy_is_use_all': False,
+            'outputs': batch.commits,
+            'target_slate_version': None,
+            'payment_proof_recipient_address': None,
+            'ttl_blocks': None,
+            'send_args': {
+                'dest': self.self_dest,
+                'post_tx': True,
+                'fluff': self.fluff,
+                'skip_tor': False,
+            },
+        }
+        try:
+            batch.sent_height = int(self.wallet.node_height()['height'])
+            slate = self.wallet.init_send_tx(args)
+        except WalletError as e:
+            # A JSON-RPC error is a refusal, an HTTP error leaves it open
+            # whether the wallet posted the tx
+            refused = not (isinstance(e.code, int) and e.code > 0)
+            batch.status = ConsolidationBatch.FAILED if refused else ConsolidationBatch.UNKNOWN
+            batch.error = e
+            return batch
+        except Exception as e:
+            batch.status = ConsolidationBatch.UNKNOWN
+            batch.error = e
+            return batch
+
+        # Posted: from here on errors only mean the kernel is unknown
+        batch.slate_id = slate['id']
+        batch.sent_at = time.time()
+        batch.status = ConsolidationBatch.SENT
+        try:
+            txs = self.wallet.retrieve_txs(tx_slate_id=batch.slate_id, refresh=False)
+            batch.kernel_excess = txs[0].get('kernel_excess') if txs else None
+        except Exception as e:
+            batch.error = e
+        return batch
+
+    def wait_confirmed(self, batches, timeout=None):
+        '''Block until every sent batch is confirmed or timeout seconds passed'''
+        sent = [b for b in batches if b.status == ConsolidationBatch.SENT]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.tracker is not None:
+            done = threading.Semaphore(0)
+            def confirmed(batch):
+                def callback(excess, height, confirmations):
+                    batch.status = ConsolidationBatch.CONFIRMED
+                    batch.confirmed_at = time.time()
+                    done.release()
+                return callback
+            # Sends may have waited hours for a window, so each kernel is
+            # looked up from the height its batch was sent at
+            waiting = 0
+            for batch in sent:
+                if batch.kernel_excess:
+                    self.tracker.track(batch.kernel_excess, self.confirmations, confirmed(batch),
+                                       min_height=batch.sent_height)
+                    waiting += 1
+            for _ in range(waiting):
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                if not done.acquire(timeout=remaining):
+                    break
+            return
+
+        while sent:
+            height = int(self.wallet.node_height()['height'])
+            for batch in list(sent):
+                txs = self.wallet.retrieve_txs(tx_slate_id=batch.slate_id, refresh=True)
+                tx = txs[0] if txs else None
+                if tx is None or tx.get('tx_type', '').endswith('Cancelled'):
+                    batch.status = ConsolidationBatch.FAILED
+                    sent.remove(batch)
+                elif tx['confirmed'] and height - int(tx.get('output_height') or height) + 1 >= self.confirmations:
+                    batch.status = ConsolidationBatch.CONFIRMED
+                    batch.confirmed_at = time.time()
+                    sent.remove(batch)
+            if not sent or (deadline is not None and time.monotonic() >= deadline):
+                return
+            time.sleep(self.poll_interval)
+
+    def run(self, batches, wait=True, timeout=None):
+        '''Send all batches and, with wait, track them to confirmation. Returns a ConsolidationReport'''
+        outputs_before = len(self.wallet.retrieve_outputs(refresh=False))
+        latency_before = None
+        if self.latency_amount is not None:
+            latency_before = measure_send_latency(self.wallet, self.latency_amount)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(self.send, batches))
+        if wait:
+            self.wait_confirmed(batches, timeout)
+
+        outputs_after = len(self.wallet.retrieve_outputs(refresh=wait))
+        latency_after = None
+        if self.latency_amount is not None:
+            latency_after = measure_send_latency(self.wallet, self.latency_amount)
+        return ConsolidationReport(batches, outputs_before, outputs_after, latency_before, latency_after)
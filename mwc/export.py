@@ -0,0 +1,361 @@
+# Routines for exporting wallet history and chain data to files
+#
+# Records go straight from the API results to a writer, one row at a time:
+# no intermediate DataFrame and no second copy of the data. Writers exist for
+# CSV, JSON Lines and Parquet (in row groups, needs pyarrow).
+#
+# Incremental exports keep a high-water mark per stream (last tx log id, last
+# output height, last block height) in a small JSON state file, and only
+# append records above it on the next run. Tx log entries and outputs that
+# are still pending are left for a later run, so they are exported once, in
+# their final state.
+#
+# usage:
+#   marks = HighWaterMarks('exports/state.json')
+#   with CsvWriter('exports/txs.csv', TX_FIELDS, append=True) as writer:
+#       export_txs(wallet, writer, marks)
+#   with ParquetWriter('exports/blocks', BLOCK_FIELDS) as writer:
+#       export_blocks(node, writer, marks, end_height=node.get_status()['tip']['height'])
+#
+
+import csv, json, os
+from concurrent.futures import ThreadPoolExecutor
+
+TX_FIELDS = ('id', 'tx_type', 'tx_slate_id', 'confirmed', 'creation_ts', 'confirmation_ts',
+             'amount_credited', 'amount_debited', 'fee', 'num_inputs', 'num_outputs',
+             'kernel_excess', 'output_height', 'ttl_cutoff_height', 'parent_key_id',
+             'messages', 'payment_proof')
+
+OUTPUT_FIELDS = ('commit', 'value', 'status', 'height', 'lock_height', 'is_coinbase',
+                 'mmr_index', 'n_child', 'key_id', 'root_key_id', 'tx_log_entry')
+
+BLOCK_FIELDS = ('height', 'hash', 'previous', 'timestamp', 'total_difficulty',
+                'secondary_scaling', 'edge_bits', 'num_inputs', 'num_outputs',
+                'num_kernels', 'fees', 'kernel_excesses')
+
+# Column types for typed formats (Parquet); fields not listed are strings.
+# Wallet amounts arrive as decimal strings and are converted.
+FIELD_TYPES = {
+    'id': 'int', 'confirmed': 'bool', 'amount_credited': 'uint', 'amount_debited': 'uint',
+    'fee': 'uint', 'num_inputs': 'int', 'num_outputs': 'int', 'output_height': 'int',
+    'ttl_cutoff_height': 'int',
+    'value': 'uint', 'height': 'int', 'lock_height': 'int', 'is_coinbase': 'bool',
+    'mmr_index': 'int', 'n_child': 'int', 'tx_log_entry': 'int',
+    'total_difficulty': 'uint', 'secondary_scaling': 'int', 'edge_bits': 'int',
+    'num_kernels': 'int', 'fees': 'uint',
+}
+
+
+def _flat(value):
+    # Nested values are stored as JSON text, everything else as is
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(',', ':'))
+    return value
+
+
+class Writer:
+    def __init__(self, path, fields, append=False):
+        self.path = path
+        self.fields = tuple(fields)
+        self.append = append
+        self.count = 0
+
+    def write(self, record):
+        raise NotImplementedError
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def flush(self):
+        '''Make everything written so far durable before a mark is saved'''
+        pass
+
+    # Rows between high-water mark saves that suit the format, see export_blocks
+    commit_every = 1000
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvWriter(Writer):
+    def __init__(self, path, fields, append=False):
+        super().__init__(path, fields, append)
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'a' if append else 'w', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fields, extrasaction='ignore')
+        if not exists:
+            self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow({f: _flat(record.get(f)) for f in self.fields})
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesWriter(Writer):
+    def __init__(self, path, fields=None, append=False):
+        super().__init__(path, fields or (), append)
+        self.file = open(path, 'a' if append else 'w')
+
+    def write(self, record):
+        if self.fields:
+            record = {f: record.get(f) for f in self.fields}
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def _typed(kind, value):
+    if value is None:
+        return None
+    if kind in ('int', 'uint'):
+        return int(value)
+    if kind == 'bool':
+        return bool(value)
+    value = _flat(value)
+    return value if isinstance(value, str) else str(value)
+
+
+class ParquetWriter(Writer):
+    '''
+    Writes a Parquet dataset directory in row groups of row_group_size, so
+    only one group is held in memory. The schema is fixed by FIELD_TYPES, a
+    column that is all None in one group still has its type.
+
+    A Parquet file is only readable once its footer is written, so flush()
+    closes the current part file and the next rows go to a new one. Parts are
+    written under a .tmp name and renamed when complete, an interrupted run
+    leaves no broken part in the dataset. Parquet files cannot be appended
+    to, so with append=True new parts are added next to the existing ones.
+    '''
+    def __init__(self, path, fields, append=True, row_group_size=50000):
+        super().__init__(path, fields, append)
+        try:
+            import pyarrow, pyarrow.parquet
+        except ImportError as e:
+            raise ImportError('ParquetWriter requires pyarrow, install it with: pip install pyarrow') from e
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.row_group_size = row_group_size
+        self.commit_every = row_group_size
+        os.makedirs(path, exist_ok=True)
+        parts = sorted(p for p in os.listdir(path) if p.startswith('part-') and p.endswith('.parquet'))
+        if not append:
+            for part in parts:
+                os.remove(os.path.join(path, part))
+            parts = []
+        for tmp in os.listdir(path):
+            if tmp.endswith('.parquet.tmp'):
+                os.remove(os.path.join(path, tmp))
+        self.part_index = max((int(p[5:-8]) for p in parts), default=-1) + 1
+        self.kinds = [FIELD_TYPES.get(f, 'str') for f in self.fields]
+        types = {'int': pyarrow.int64(), 'uint': pyarrow.uint64(), 'bool': pyarrow.bool_(),
+                 'str': pyarrow.string()}
+        self.schema = pyarrow.schema([(f, types[k]) for f, k in zip(self.fields, self.kinds)])
+        self.columns = {f: [] for f in self.fields}
+        self.pending = 0
+        self.writer = None
+        self.part_path = None
+
+    def write(self, record):
+        for f, kind in zip(self.fields, self.kinds):
+            self.columns[f].append(_typed(kind, record.get(f)))
+        self.pending += 1
+        self.count += 1
+        if self.pending >= self.row_group_size:
+            self._write_group()
+
+    def _write_group(self):
+        if not self.pending:
+            return
+        if self.writer is None:
+            self.part_path = os.path.join(self.path, f'part-{self.part_index:05d}.parquet')
+            self.writer = self.pq.ParquetWriter(self.part_path + '.tmp', self.schema)
+        self.writer.write_table(self.pa.table(self.columns, schema=self.schema))
+        self.columns = {f: [] for f in self.fields}
+        self.pending = 0
+
+    def flush(self):
+        '''Complete the current part file; later rows start a new part'''
+        self._write_group()
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.part_path + '.tmp', self.part_path)
+            self.writer = None
+            self.part_index += 1
+
+    def close(self):
+        self.flush()
+
+
+WRITERS = {
+    'csv': CsvWriter,
+    'jsonl': JsonLinesWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def open_writer(format, path, fields, append=False):
+    if format not in WRITERS:
+        raise ValueError(f'Unknown export format {format}, expected one of {", ".join(WRITERS)}')
+    return WRITERS[format](path, fields, append=append)
+
+
+class HighWaterMarks:
+    '''Last exported position per stream, persisted as JSON'''
+    def __init__(self, path=None):
+        self.path = path
+        self.marks = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.marks = json.load(f)
+
+    def get(self, stream):
+        return self.marks.get(stream)
+
+    def set(self, stream, value):
+        self.marks[stream] = value
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.marks, f)
+        os.replace(tmp, self.path)
+
+
+def _settled(tx):
+    # Confirmed, cancelled and reverted entries do not change any more
+    return tx['confirmed'] or tx['tx_type'] in ('TxReceivedCancelled', 'TxSentCancelled', 'TxReverted')
+
+
+def export_txs(wallet, writer, marks=None, refresh=True):
+    '''
+    Write tx log entries with an id above the 'txs' mark. Entries are written
+    in id order and the mark is saved once the writer has them all. With marks,
+    writing stops at the first entry that is neither confirmed nor cancelled,
+    so it is exported in its final state by a later run.
+    Returns the number of records written.
+    '''
+    since = marks.get('txs') if marks is not None else None
+    txs = wallet.retrieve_txs(refresh=refresh)
+    txs.sort(key=lambda tx: tx['id'])
+    last = since
+    written = 0
+    for tx in txs:
+        if since is not None and tx['id'] <= since:
+            continue
+        if marks is not None and not _settled(tx):
+            break
+        writer.write(tx)
+        last = tx['id']
+        written += 1
+    if marks is not None and last is not None:
+        writer.flush()
+        marks.set('txs', last)
+        marks.save()
+    return written
+
+
+def export_outputs(wallet, writer, marks=None, include_spent=True, refresh=True):
+    '''
+    Write outputs confirmed above the 'outputs' height mark. Unconfirmed
+    outputs (height 0) are left for a later run. Returns the number written.
+    '''
+    since = marks.get('outputs') if marks is not None else None
+    outputs = wallet.retrieve_outputs(include_spent=include_spent, refresh=refresh)
+    rows = []
+    for mapping in outputs:
+        output = mapping.get('output', mapping)
+        height = int(output['height'])
+        if height == 0 or (since is not None and height <= since):
+            continue
+        rows.append((height, output))
+    rows.sort(key=lambda r: r[0])
+    last = since
+    for height, output in rows:
+        writer.write(output)
+        last = height
+    if marks is not None and last is not None:
+        writer.flush()
+        marks.set('outputs', last)
+        marks.save()
+    return len(rows)
+
+
+def block_record(block):
+    '''Flatten a get_block result into one BLOCK_FIELDS row'''
+    header = block['header']
+    kernels = block.get('kernels', [])
+    return {
+        'height': header['height'],
+        'hash': header['hash'],
+        'previous': header['previous'],
+        'timestamp': header['timestamp'],
+        'total_difficulty': header['total_difficulty'],
+        'secondary_scaling': header['secondary_scaling'],
+        'edge_bits': header['edge_bits'],
+        'num_inputs': len(block.get('inputs', [])),
+        'num_outputs': len(block.get('outputs', [])),
+        'num_kernels': len(kernels),
+        'fees': sum(int(k.get('fee', 0)) for k in kernels),
+        'kernel_excesses': [k['excess'] for k in kernels],
+    }
+
+
+def export_blocks(node, writer, marks=None, start_height=0, end_height=None, concurrency=4,
+                  save_every=None):
+    '''
+    Write one row per block from the 'blocks' mark (or start_height) up to
+    end_height, default the current tip. Blocks are fetched concurrently but
+    written in height order, at most 4 * concurrency are buffered. The mark is
+    saved every save_every blocks, by default the writer's commit_every (one
+    row group for Parquet), so an interrupted export resumes close to where it
+    stopped. Returns the number of rows written.
+    '''
+    if save_every is None:
+        save_every = writer.commit_every
+    since = marks.get('blocks') if marks is not None else None
+    if since is not None:
+        start_height = since + 1
+    if end_height is None:
+        end_height = node.get_status()['tip']['height']
+
+    written = 0
+    window = 4 * concurrency
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for chunk_start in range(start_height, end_height + 1, window):
+            heights = range(chunk_start, min(chunk_start + window, end_height + 1))
+            for block in pool.map(lambda h: node.get_block(height=h), heights):
+                writer.write(block_record(block))
+                written += 1
+                if marks is not None and written % save_every == 0:
+                    writer.flush()
+                    marks.set('blocks', block['header']['height'])
+                    marks.save()
+    if marks is not None and written:
+        writer.flush()
+        marks.set('blocks', end_height)
+        marks.save()
+    return written
@@ -0,0 +1,295 @@
+# Light sync of the MWC header chain into a memory-mapped file
+#
+# A HeaderStore keeps one fixed-width record per height:
+#
+#   hash               32 bytes
+#   timestamp          int64, unix seconds
+#   total_difficulty   uint64
+#   secondary_scaling  uint32
+#   version            uint16
+#   edge_bits          uint8
+#
+# after a 16 byte file header (magic, record size, number of records). The
+# file is memory-mapped, so height -> hash / timestamp / difficulty lookups are
+# O(1) reads without any RPC, and array() returns a zero-copy NumPy view of all
+# records. Opening an existing store only maps the file.
+#
+# sync_headers() fetches the missing headers in parallel, in batches, checks
+# that every header links to the one below it and rolls the store back when
+# the node switched to a fork. A ChainWatcher can keep it current in between:
+#
+# usage:
+#   store = HeaderStore('/var/lib/mwc/headers.bin')
+#   sync_headers(node, store, concurrency=8)
+#   watcher.subscribe(store.handle_event)
+#   store.hash(1000000), store.timestamp(1000000)
+#
+
+import mmap, os, struct, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+MAGIC = b'MWCHDRS1'
+FILE_HEADER = struct.Struct('<8sII')        # magic, record size, count
+RECORD = struct.Struct('<32sqQIHBx')
+FIELDS = ('hash', 'timestamp', 'total_difficulty', 'secondary_scaling', 'version', 'edge_bits')
+
+# Records added to the file at a time, so the map is not rebuilt on every append
+GROW_RECORDS = 65536
+
+
+class HeaderStoreError(Exception):
+    pass
+
+
+def _timestamp(value):
+    # Node timestamps are RFC3339 strings
+    if isinstance(value, str):
+        return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+    return int(value)
+
+
+def pack_header(header):
+    '''Pack a get_header result (dict or mwc.models.BlockHeader) into a record'''
+    return RECORD.pack(
+        bytes.fromhex(header.get('hash')),
+        _timestamp(header.get('timestamp')),
+        int(header.get('total_difficulty')),
+        int(header.get('secondary_scaling')),
+        int(header.get('version')),
+        int(header.get('edge_bits')),
+    )
+
+
+class HeaderStore:
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.lock = threading.RLock()
+        self.map = None
+        self.count = 0
+
+        if not os.path.exists(path):
+            if readonly:
+                raise HeaderStoreError(f'No header store at {path}')
+            with open(path, 'wb') as f:
+                f.write(FILE_HEADER.pack(MAGIC, RECORD.size, 0))
+                f.truncate(FILE_HEADER.size + GROW_RECORDS * RECORD.size)
+
+        self.file = open(path, 'rb' if readonly else 'r+b')
+        magic, record_size, count = FILE_HEADER.unpack(self.file.read(FILE_HEADER.size))
+        if magic != MAGIC or record_size != RECORD.size:
+            self.file.close()
+            raise HeaderStoreError(f'{path} is not a header store with {RECORD.size} byte records')
+        self.count = count
+        self._map()
+
+    def _map(self):
+        # Views handed out by array() keep an old map alive until they are gone,
+        # so it is dropped rather than closed
+        access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+        self.map = mmap.mmap(self.file.fileno(), 0, access=access)
+
+    def _capacity(self):
+        return (len(self.map) - FILE_HEADER.size) // RECORD.size
+
+    def _reserve(self, count):
+        if count <= self._capacity():
+            return
+        records = (count // GROW_RECORDS + 1) * GROW_RECORDS
+        self.file.truncate(FILE_HEADER.size + records * RECORD.size)
+        self._map()
+
+    def _set_count(self, count):
+        self.count = count
+        FILE_HEADER.pack_into(self.map, 0, MAGIC, RECORD.size, count)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def height(self):
+        '''Height of the last stored header, None when empty'''
+        return self.count - 1 if self.count else None
+
+    def _offset(self, height):
+        if not 0 <= height < self.count:
+            raise IndexError(f'Height {height} not in store (0..{self.count - 1})')
+        return FILE_HEADER.size + height * RECORD.size
+
+    def record(self, height):
+        '''Raw record tuple for a height'''
+        return RECORD.unpack_from(self.map, self._offset(height))
+
+    def get(self, height):
+        record = self.record(height)
+        result = dict(zip(FIELDS, record))
+        result['hash'] = record[0].hex()
+        result['height'] = height
+        return result
+
+    __getitem__ = get
+
+    def hash(self, height):
+        offset = self._offset(height)
+        return self.map[offset:offset + 32].hex()
+
+    def timestamp(self, height):
+        return self.record(height)[1]
+
+    def total_difficulty(self, height):
+        return self.record(height)[2]
+
+    def height_of(self, hash_, max_depth=None):
+        '''
+        Height of the block with this hash, searching down from the tip (recent
+        blocks are the usual question), at most max_depth records. None if absent.
+        '''
+        needle = bytes.fromhex(hash_)
+        stop = -1 if max_depth is None else max(-1, self.count - 1 - max_depth)
+        for height in range(self.count - 1, stop, -1):
+            offset = FILE_HEADER.size + height * RECORD.size
+            if self.map[offset:offset + 32] == needle:
+                return height
+        return None
+
+    def append(self, header):
+        '''Add the header for the next height'''
+        self.extend([header], self.count)
+
+    def extend(self, headers, height):
+        '''
+        Write consecutive headers starting at height, which must be the next
+        height of the store. The count is updated after the records are written.
+        '''
+        if self.readonly:
+            raise HeaderStoreError('Header store is read only')
+        with self.lock:
+            if height != self.count:
+                raise HeaderStoreError(f'Expected header {self.count}, got {height}')
+            self._reserve(self.count + len(headers))
+            offset = FILE_HEADER.size + self.count * RECORD.size
+            for header in headers:
+                self.map[offset:offset + RECORD.size] = pack_header(header)
+                offset += RECORD.size
+            self._set_count(self.count + len(headers))
+
+    def truncate(self, height):
+        '''Drop every header above height (-1 empties the store)'''
+        if self.readonly:
+            raise HeaderStoreError('Header store is read only')
+        with self.lock:
+            if height + 1 < self.count:
+                self._set_count(height + 1)
+
+    def handle_event(self, event):
+        '''
+        ChainWatcher subscriber. Blocks that do not link to the stored tip are
+        ignored; the next sync_headers fills the gap.
+        '''
+        with self.lock:
+            if event.kind == event.REORG:
+                self.truncate(event.fork_height)
+                return
+            header = event.header
+            if event.height != self.count:
+                return
+            if self.count and header.get('previous') != self.hash(self.count - 1):
+                return
+            self.append(header)
+
+    def flush(self):
+        self.map.flush()
+
+    def array(self):
+        '''Zero-copy NumPy structured view of all stored headers, index = height'''
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError('HeaderStore.array requires numpy, install it with: pip install numpy') from e
+        dtype = np.dtype({
+            'names': list(FIELDS),
+            'formats': ['S32', '<i8', '<u8', '<u4', '<u2', 'u1'],
+            'offsets': [0, 32, 40, 48, 52, 54],
+            'itemsize': RECORD.size,
+        })
+        return np.frombuffer(self.map, dtype=dtype, count=self.count, offset=FILE_HEADER.size)
+
+    def close(self):
+        if self.map is not None and not self.readonly:
+            self.map.flush()
+        self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f'HeaderStore({self.path}, height={self.height})'
+
+
+def _fork_height(node, store, tip_height, max_reorg_depth):
+    # Highest stored height whose hash the node still agrees with; headers
+    # above the node tip are not on its chain
+    height = min(store.height, tip_height)
+    lowest = max(-1, height - max_reorg_depth)
+    while height > lowest:
+        if node.get_header(height=height)['hash'] == store.hash(height):
+            return height
+        height -= 1
+    if height < 0:
+        return -1
+    raise HeaderStoreError(f'No common block in the last {max_reorg_depth} headers, rebuild the store')
+
+
+def sync_headers(node, store, concurrency=8, batch_size=1000, end_height=None,
+                 max_reorg_depth=1000, on_batch=None):
+    '''
+    Bring the store up to end_height, default the node tip. Headers are fetched
+    concurrently in batches of batch_size and appended one batch at a time, so
+    an interrupted sync resumes after the last complete batch. A stored tip the
+    node no longer agrees with is rolled back to the fork first, and a chain
+    switch during the sync is handled the same way. A store already past
+    end_height is only rolled back for a fork, never down to end_height.
+    on_batch(store) is called after each batch. Returns the number of headers added.
+    '''
+    added = 0
+    restarts = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            # The fork is searched from the stored tip, not from end_height, so
+            # a store already past end_height keeps the headers the node agrees with
+            tip_height = node.get_status()['tip']['height']
+            target = tip_height if end_height is None else end_height
+            if store.count:
+                fork = _fork_height(node, store, tip_height, max_reorg_depth)
+                store.truncate(fork)
+            if store.count > target:
+                return added
+
+            relinked = True
+            for start in range(store.count, target + 1, batch_size):
+                heights = range(start, min(start + batch_size, target + 1))
+                headers = list(pool.map(lambda h: node.get_header(height=h), heights))
+                previous = store.hash(start - 1) if start else None
+                for header in headers:
+                    if previous is not None and header.get('previous') != previous:
+                        relinked = False
+                        break
+                    previous = header.get('hash')
+                if not relinked:
+                    # The node switched branches while we were fetching
+                    restarts += 1
+                    if restarts > 3:
+                        raise HeaderStoreError(f'Headers from {start} do not link to the stored chain')
+                    break
+                store.extend(headers, start)
+                added += len(headers)
+                if on_batch is not None:
+                    on_batch(store)
+            store.flush()
+            if relinked:
+                return added
@@ -0,0 +1,177 @@
+# Client side concurrency and rate limits for node and wallet endpoints
+#
+# Fanning out get_block / get_kernel or wallet calls from many workers can push
+# a node, or the single threaded wallet owner API, past the point where
+# latency collapses. Instead of hand tuning worker counts, attach limits to
+# the client and let it find the sustainable concurrency by itself:
+#
+#   AdaptiveLimiter  AIMD concurrency limit: grows by one per round of calls
+#                    completing at normal latency, halves when latency rises
+#                    well above the observed baseline or calls fail
+#   TokenBucket      optional hard cap on requests per second
+#
+# usage:
+#   node = NodeV2(...)
+#   limit(node, rate=50)                # adaptive concurrency + 50 calls/s
+#   with ThreadPoolExecutor(64) as pool:
+#       blocks = list(pool.map(lambda h: node.get_block(h), heights))
+#
+
+import threading, time
+
+from mwc.transport import default_transport
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial=4, min_limit=1, max_limit=64, tolerance=2.0, backoff=0.5,
+                 target_latency=None, window=200):
+        '''
+        initial/min_limit/max_limit: bounds for the number of calls in flight
+        tolerance: latency above tolerance * baseline counts as overload
+        backoff: factor applied to the limit on overload
+        target_latency: optional absolute latency (seconds) that counts as overload
+        window: samples after which the baseline (minimum latency) is renewed,
+            so it follows a node that got slower for good
+        '''
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.target_latency = target_latency
+        self.window = window
+
+        # Baseline is the minimum latency over the current and previous window
+        self.window_min = None
+        self.previous_min = None
+        self.samples = 0
+        self.inflight = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        '''Wait for a free slot, returns False on timeout'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.inflight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            self.inflight += 1
+            return True
+
+    def release(self, latency, ok=True):
+        '''Return a slot with the latency of the call and whether it succeeded'''
+        now = time.monotonic()
+        with self.condition:
+            self.inflight -= 1
+            overload = not ok
+            if ok:
+                self._sample(latency)
+                if latency > self.tolerance * self.baseline:
+                    overload = True
+                if self.target_latency is not None and latency > self.target_latency:
+                    overload = True
+            if overload:
+                # Decrease at most once per baseline latency, a burst of slow
+                # responses is one congestion signal, not many
+                if now - self.last_decrease > (self.baseline or latency):
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    def _sample(self, latency):
+        if self.window_min is None or latency < self.window_min:
+            self.window_min = latency
+        self.samples += 1
+        if self.samples >= self.window:
+            self.previous_min = self.window_min
+            self.window_min = None
+            self.samples = 0
+
+    @property
+    def baseline(self):
+        '''Latency of an unloaded endpoint, estimated as the recent minimum'''
+        values = [v for v in (self.window_min, self.previous_min) if v is not None]
+        return min(values) if values else None
+
+    def __repr__(self):
+        baseline = 'n/a' if self.baseline is None else f'{self.baseline * 1000:.1f}ms'
+        return f'AdaptiveLimiter(limit={self.limit:.1f}, inflight={self.inflight}, baseline={baseline})'
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        '''rate: tokens per second; burst: bucket size, default one second worth'''
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        '''Block until tokens are available and take them'''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class LimitedTransport:
+    '''
+    Wraps a transport so every call goes through a concurrency limiter and an
+    optional token bucket. Transport exceptions, HTTP 429 and 5xx responses
+    count as overload.
+    '''
+    def __init__(self, inner, limiter=None, bucket=None):
+        self.inner = inner
+        self.limiter = limiter
+        self.bucket = bucket
+
+    def post(self, url, payload, auth, secret=None):
+        if self.bucket is not None:
+            self.bucket.acquire()
+        limiter = self.limiter
+        if limiter is None:
+            return self.inner.post(url, payload, auth, secret)
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = self.inner.post(url, payload, auth, secret)
+        except Exception:
+            limiter.release(time.monotonic() - start, ok=False)
+            raise
+        ok = response.status_code != 429 and response.status_code < 500
+        limiter.release(time.monotonic() - start, ok=ok)
+        return response
+
+    @property
+    def stats(self):
+        return getattr(self.inner, 'stats', None)
+
+    def close(self):
+        if hasattr(self.inner, 'close'):
+            self.inner.close()
+
+
+def limit(client, limiter=None, rate=None, burst=None, adaptive=True):
+    '''
+    Attach limits to a NodeV2 or WalletV3 (or anything with a transport
+    attribute). By default an AdaptiveLimiter is used; rate adds a TokenBucket.
+    Returns the LimitedTransport so its limiter can be inspected.
+    '''
+    if limiter is None and adaptive:
+        limiter = AdaptiveLimiter()
+    bucket = TokenBucket(rate, burst) if rate is not None else None
+    transport = LimitedTransport(client.transport or default_transport(), limiter, bucket)
+    client.transport = transport
+    return transport
@@ -0,0 +1,358 @@
+# Compact typed records for wallet and node API results
+#
+# retrieve_outputs, retrieve_txs, get_header and get_block return nested dicts
+# with numbers encoded as strings. The classes below hold the same data in
+# __slots__ objects: numbers as ints, hashes and commitments as raw bytes and
+# repeated enum strings interned. Rarely used nested fields (cuckoo solutions,
+# payment proofs, stored tx data, block bodies) are kept in their packed or
+# JSON form and only decoded on first access. Decoded timestamps are cached
+# on the record, so repeated reads do not parse the string again.
+#
+# Every record keeps a `raw` property that rebuilds the dict in the API shape,
+# including fields the record does not know about.
+#
+# usage:
+#   outputs = parse_outputs(wallet.retrieve_outputs())
+#   txs = parse_txs(wallet.retrieve_txs())
+#   header = BlockHeader.from_api(node.get_header(1036985))
+#
+
+import struct, sys
+from datetime import datetime
+
+
+def _int(value):
+    # The wallet API encodes u64 values as strings
+    return None if value is None else int(value)
+
+def _str(value):
+    return None if value is None else str(value)
+
+def _hex_bytes(value):
+    return None if value is None else bytes.fromhex(value)
+
+def _bytes_hex(value):
+    return None if value is None else value.hex()
+
+def _intern(value):
+    return None if value is None else sys.intern(value)
+
+def _timestamp(value):
+    # RFC3339 timestamps as produced by chrono, e.g. 2019-11-11T16:43:31.123456789+00:00
+    if value is None:
+        return None
+    value = value.replace('Z', '+00:00')
+    date, sep, rest = value.partition('.')
+    if sep:
+        # datetime only supports microseconds
+        end = len(rest) - len(rest.lstrip('0123456789'))
+        digits, zone = rest[:end], rest[end:]
+        value = f'{date}.{digits[:6].ljust(6, "0")}{zone}'
+    return datetime.fromisoformat(value)
+
+
+class Record:
+    __slots__ = ('_extra', '_decoded')
+
+    # (attribute, api key, decode, encode) for every field stored in a slot
+    FIELDS = ()
+
+    @classmethod
+    def from_api(cls, data):
+        record = cls.__new__(cls)
+        for attr, key, decode, _ in cls.FIELDS:
+            setattr(record, attr, decode(data.get(key)))
+        known = cls._fields()
+        extra = {k: v for k, v in data.items() if k not in known}
+        record._extra = extra or None
+        record._decoded = None
+        return record
+
+    @classmethod
+    def _fields(cls):
+        # api key -> (attribute, encode), built once per class
+        fields = cls.__dict__.get('_field_map')
+        if fields is None:
+            fields = {key: (attr, encode) for attr, key, _, encode in cls.FIELDS}
+            cls._field_map = fields
+        return fields
+
+    def _decode(self, attr, decode):
+        # Decode a slot on first access and keep the result
+        if self._decoded is None:
+            self._decoded = {}
+        elif attr in self._decoded:
+            return self._decoded[attr]
+        value = decode(getattr(self, attr))
+        self._decoded[attr] = value
+        return value
+
+    @property
+    def raw(self):
+        data = {key: encode(getattr(self, attr)) for attr, key, _, encode in self.FIELDS}
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def get(self, key, default=None):
+        '''dict style access to any API field, known or not'''
+        field = self._fields().get(key)
+        if field is not None:
+            attr, encode = field
+            return encode(getattr(self, attr))
+        if self._extra:
+            return self._extra.get(key, default)
+        return default
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.raw == other.raw
+
+    def __repr__(self):
+        fields = ', '.join(f'{key}={getattr(self, key)!r}' for _, key, _, _ in self.FIELDS[:4])
+        return f'{type(self).__name__}({fields}, ...)'
+
+
+# One entry of WalletV3.retrieve_outputs, the commit/output mapping flattened
+class OutputCommit(Record):
+    __slots__ = ('_commit', 'value', 'height', 'lock_height', 'status', 'is_coinbase',
+                 'mmr_index', 'n_child', '_key_id', '_root_key_id', 'tx_log_entry')
+
+    FIELDS = (
+        ('_commit', 'commit', _hex_bytes, _bytes_hex),
+        ('value', 'value', _int, _str),
+        ('height', 'height', _int, _str),
+        ('lock_height', 'lock_height', _int, _str),
+        ('status', 'status', _intern, lambda v: v),
+        ('is_coinbase', 'is_coinbase', bool, bool),
+        ('mmr_index', 'mmr_index', _int, lambda v: v),
+        ('n_child', 'n_child', _int, lambda v: v),
+        ('_key_id', 'key_id', _hex_bytes, _bytes_hex),
+        ('_root_key_id', 'root_key_id', _hex_bytes, _bytes_hex),
+        ('tx_log_entry', 'tx_log_entry', _int, lambda v: v),
+    )
+
+    @classmethod
+    def from_api(cls, data):
+        # Accept both the {'commit': ..., 'output': {...}} mapping and a bare output
+        output = data.get('output', data)
+        return super().from_api(output)
+
+    @property
+    def raw(self):
+        output = Record.raw.fget(self)
+        return {'commit': output['commit'], 'output': output}
+
+    @property
+    def commit(self):
+        return _bytes_hex(self._commit)
+
+    @property
+    def key_id(self):
+        return _bytes_hex(self._key_id)
+
+    @property
+    def root_key_id(self):
+        return _bytes_hex(self._root_key_id)
+
+    def confirmations(self, tip_height):
+        if not self.height or self.status not in ('Unspent', 'Locked', 'Spent'):
+            return 0
+        return max(0, tip_height - self.height + 1)
+
+    def is_spendable(self, tip_height, minimum_confirmations=1):
+        return (self.status == 'Unspent' and self.lock_height <= tip_height
+                and self.confirmations(tip_height) >= minimum_confirmations)
+
+
+# One entry of WalletV3.retrieve_txs
+class TxLogEntry(Record):
+    __slots__ = ('id', 'tx_type', 'confirmed', 'amount_credited', 'amount_debited', 'fee',
+                 'num_inputs', 'num_outputs', 'tx_slate_id', '_kernel_excess',
+                 'kernel_lookup_min_height', 'output_height', 'ttl_cutoff_height',
+                 '_parent_key_id', '_creation_ts', '_confirmation_ts', '_nested')
+
+    FIELDS = (
+        ('id', 'id', _int, lambda v: v),
+        ('tx_type', 'tx_type', _intern, lambda v: v),
+        ('confirmed', 'confirmed', bool, bool),
+        ('amount_credited', 'amount_credited', _int, _str),
+        ('amount_debited', 'amount_debited', _int, _str),
+        ('fee', 'fee', _int, _str),
+        ('num_inputs', 'num_inputs', _int, lambda v: v),
+        ('num_outputs', 'num_outputs', _int, lambda v: v),
+        ('tx_slate_id', 'tx_slate_id', _str, lambda v: v),
+        ('_kernel_excess', 'kernel_excess', _hex_bytes, _bytes_hex),
+        ('kernel_lookup_min_height', 'kernel_lookup_min_height', _int, lambda v: v),
+        ('output_height', 'output_height', _int, lambda v: v),
+        ('ttl_cutoff_height', 'ttl_cutoff_height', _int, _str),
+        ('_parent_key_id', 'parent_key_id', _hex_bytes, _bytes_hex),
+        ('_creation_ts', 'creation_ts', _str, lambda v: v),
+        ('_confirmation_ts', 'confirmation_ts', _str, lambda v: v),
+    )
+
+    # Nested fields that are kept as they came and decoded on demand
+    NESTED = ('messages', 'payment_proof', 'stored_tx')
+
+    @classmethod
+    def from_api(cls, data):
+        record = super().from_api(data)
+        nested = {}
+        if record._extra:
+            for key in cls.NESTED:
+                value = record._extra.pop(key, None)
+                if value is not None:
+                    nested[key] = value
+            if not record._extra:
+                record._extra = None
+        record._nested = nested or None
+        return record
+
+    @property
+    def raw(self):
+        data = Record.raw.fget(self)
+        for key in self.NESTED:
+            data[key] = self._nested.get(key) if self._nested else None
+        return data
+
+    def get(self, key, default=None):
+        if key in self.NESTED:
+            return self._nested.get(key) if self._nested else None
+        return super().get(key, default)
+
+    @property
+    def kernel_excess(self):
+        return _bytes_hex(self._kernel_excess)
+
+    @property
+    def parent_key_id(self):
+        return _bytes_hex(self._parent_key_id)
+
+    @property
+    def creation_ts(self):
+        return self._decode('_creation_ts', _timestamp)
+
+    @property
+    def confirmation_ts(self):
+        return self._decode('_confirmation_ts', _timestamp)
+
+    @property
+    def messages(self):
+        return self._nested.get('messages') if self._nested else None
+
+    @property
+    def payment_proof(self):
+        return self._nested.get('payment_proof') if self._nested else None
+
+    @property
+    def stored_tx(self):
+        return self._nested.get('stored_tx') if self._nested else None
+
+    @property
+    def net_amount(self):
+        '''Credited minus debited, i.e. the change of the wallet balance including the fee'''
+        return (self.amount_credited or 0) - (self.amount_debited or 0)
+
+
+def _pack_solution(value):
+    return None if value is None else struct.pack(f'<{len(value)}Q', *value)
+
+def _unpack_solution(value):
+    return None if value is None else list(struct.unpack(f'<{len(value) // 8}Q', value))
+
+
+# Result of NodeV2.get_header, also the 'header' of NodeV2.get_block
+class BlockHeader(Record):
+    __slots__ = ('height', '_hash', '_previous', 'version', '_timestamp', 'total_difficulty',
+                 'secondary_scaling', 'edge_bits', 'nonce', 'output_mmr_size', 'kernel_mmr_size',
+                 '_prev_root', '_output_root', '_range_proof_root', '_kernel_root',
+                 '_total_kernel_offset', '_cuckoo_solution')
+
+    FIELDS = (
+        ('height', 'height', _int, lambda v: v),
+        ('_hash', 'hash', _hex_bytes, _bytes_hex),
+        ('_previous', 'previous', _hex_bytes, _bytes_hex),
+        ('version', 'version', _int, lambda v: v),
+        ('_timestamp', 'timestamp', _str, lambda v: v),
+        ('total_difficulty', 'total_difficulty', _int, lambda v: v),
+        ('secondary_scaling', 'secondary_scaling', _int, lambda v: v),
+        ('edge_bits', 'edge_bits', _int, lambda v: v),
+        ('nonce', 'nonce', _int, lambda v: v),
+        ('output_mmr_size', 'output_mmr_size', _int, lambda v: v),
+        ('kernel_mmr_size', 'kernel_mmr_size', _int, lambda v: v),
+        ('_prev_root', 'prev_root', _hex_bytes, _bytes_hex),
+        ('_output_root', 'output_root', _hex_bytes, _bytes_hex),
+        ('_range_proof_root', 'range_proof_root', _hex_bytes, _bytes_hex),
+        ('_kernel_root', 'kernel_root', _hex_bytes, _bytes_hex),
+        ('_total_kernel_offset', 'total_kernel_offset', _hex_bytes, _bytes_hex),
+        ('_cuckoo_solution', 'cuckoo_solution', _pack_solution, _unpack_solution),
+    )
+
+    @property
+    def hash(self):
+        return _bytes_hex(self._hash)
+
+    @property
+    def previous(self):
+        return _bytes_hex(self._previous)
+
+    @property
+    def timestamp(self):
+        return self._decode('_timestamp', _timestamp)
+
+    @property
+    def cuckoo_solution(self):
+        return _unpack_solution(self._cuckoo_solution)
+
+
+# Result of NodeV2.get_block. The header is parsed right away, the body
+# (inputs, outputs, kernels) is kept as returned and exposed as is.
+class Block:
+    __slots__ = ('header', '_body')
+
+    def __init__(self, header, body):
+        self.header = header
+        self._body = body
+
+    @classmethod
+    def from_api(cls, data):
+        body = {k: v for k, v in data.items() if k != 'header'}
+        return cls(BlockHeader.from_api(data['header']), body)
+
+    @property
+    def raw(self):
+        data = {'header': self.header.raw}
+        data.update(self._body)
+        return data
+
+    @property
+    def height(self):
+        return self.header.height
+
+    @property
+    def hash(self):
+        return self.header.hash
+
+    @property
+    def inputs(self):
+        return self._body.get('inputs', [])
+
+    @property
+    def outputs(self):
+        return self._body.get('outputs', [])
+
+    @property
+    def kernels(self):
+        return self._body.get('kernels', [])
+
+    @property
+    def kernel_excesses(self):
+        return [k['excess'] for k in self.kernels]
+
+
+def parse_outputs(outputs):
+    '''WalletV3.retrieve_outputs result -> list of OutputCommit'''
+    return [OutputCommit.from_api(o) for o in outputs]
+
+def parse_txs(txs):
+    '''WalletV3.retrieve_txs result -> list of TxLogEntry'''
+    return [TxLogEntry.from_api(t) for t in txs]
@@ -4,8 +4,10 @@
 # https://github.com/mimblewimble/grin-rfcs/blob/master/text/0007-node-api-v2.md
 #
 
-import os, requests, json
-from requests.auth import HTTPBasicAuth
+import os, json
+
+from mwc.transport import HttpTransport, default_transport
+
 # Exception class to hold wallet call error data
 class NodeError(Exception):
     def __init__(self, method, params, code, reason, api_type):
@@ -21,7 +23,7 @@ class NodeError(Exception):
 
 
 class NodeV2:
-    def __init__(self, foreign_api_url, foreign_api_user, foreign_api_password, owner_api_url, owner_api_user, owner_api_password):
+    def __init__(self, foreign_api_url, foreign_api_user, foreign_api_password, owner_api_url, owner_api_user, owner_api_password, session=None, transport=None):
         self.foreign_api_url = foreign_api_url
         self.foreign_api_user = foreign_api_user
         self.foreign_api_password = foreign_api_password
@@ -30,6 +32,12 @@ class NodeV2:
         self.owner_api_user = owner_api_user
         self.owner_api_password = owner_api_password
 
+        # mwc.transport transport, by default plain HTTP through requests;
+        # a requests.Session given as session is wrapped in an HttpTransport
+        if transport is None and session is not None:
+            transport = HttpTransport(session)
+        self.transport = transport
+
 
     def post(self, method, params, api_type):
         payload = {
@@ -39,14 +47,15 @@ class NodeV2:
             'params': params
         }
 
+        transport = self.transport or default_transport()
         if api_type == 'foreign':
-            response = requests.post(
-                    self.foreign_api_url, json=payload,
-                    auth=(self.foreign_api_user, self.foreign_api_password))
+            response = transport.post(
+                    self.foreign_api_url, payload,
+                    (self.foreign_api_user, self.foreign_api_password))
         elif api_type == 'owner':
-            response = requests.post(
-                    self.owner_api_url, json=payload,
-                    auth=(self.owner_api_user, self.owner_api_password))
+            response = transport.post(
+                    self.owner_api_url, payload,
+                    (self.owner_api_user, self.owner_api_password))
         else:
             pass
 
@@ -0,0 +1,185 @@
+# Routines for auditing payment proofs in bulk
+#
+# Fetches (retrieve_payment_proof) and verifies (verify_payment_proof) the
+# payment proofs of many transactions with bounded concurrency and streams the
+# results as they complete. Verification results of confirmed transactions
+# never change, so they are kept in a persistent SQLite cache and skipped on
+# the next audit. sender_mine / recipient_mine depend on the verifying wallet,
+# so entries are keyed by the wallet (its slatepack address) and the hash of
+# the proof, and one cache can serve several wallets.
+#
+# usage:
+#   cache = ProofCache('/var/lib/mwc/proofs.sqlite')
+#   with open('audit.csv', 'w', newline='') as f:
+#       write_report(audit(wallet, cache=cache, concurrency=8), f, 'csv')
+#
+
+import csv, hashlib, json, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from mwc.wallet_v3 import WalletError
+
+
+def proof_hash(proof):
+    '''sha256 over the canonical JSON form of a proof'''
+    canonical = json.dumps(proof, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ProofCache:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.db:
+            self.db.execute('''CREATE TABLE IF NOT EXISTS wallet_proofs (
+                wallet TEXT,
+                hash TEXT,
+                sender_mine INTEGER,
+                recipient_mine INTEGER,
+                verified_at REAL,
+                PRIMARY KEY (wallet, hash))''')
+
+    def get(self, wallet_id, hash_):
+        '''(sender_mine, recipient_mine) of a proof verified by wallet_id, or None'''
+        with self.lock:
+            row = self.db.execute('SELECT sender_mine, recipient_mine FROM wallet_proofs '
+                                  'WHERE wallet = ? AND hash = ?', (wallet_id, hash_)).fetchone()
+        if row is None:
+            return None
+        return bool(row[0]), bool(row[1])
+
+    def put(self, wallet_id, hash_, sender_mine, recipient_mine):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO wallet_proofs VALUES (?, ?, ?, ?, ?)',
+                            (wallet_id, hash_, int(sender_mine), int(recipient_mine), time.time()))
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM wallet_proofs').fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+class ProofResult:
+    FIELDS = ('tx_id', 'tx_slate_id', 'confirmed', 'proof_hash', 'ok',
+              'sender_mine', 'recipient_mine', 'cached', 'error')
+
+    def __init__(self, tx_id, tx_slate_id, confirmed, proof_hash=None, ok=False,
+                 sender_mine=None, recipient_mine=None, cached=False, error=None):
+        self.tx_id = tx_id
+        self.tx_slate_id = tx_slate_id
+        self.confirmed = confirmed
+        self.proof_hash = proof_hash
+        self.ok = ok
+        self.sender_mine = sender_mine
+        self.recipient_mine = recipient_mine
+        self.cached = cached
+        self.error = error
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    def __repr__(self):
+        state = 'pass' if self.ok else f'fail ({self.error})'
+        return f'ProofResult(tx_id={self.tx_id}, {state})'
+
+
+def bounded_map(func, items, concurrency):
+    '''
+    Like ThreadPoolExecutor.map but yields results in completion order and
+    never keeps more than 2 * concurrency items in flight.
+    '''
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        for item in items:
+            pending.add(pool.submit(func, item))
+            if len(pending) >= 2 * concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def wallet_identity(wallet):
+    '''Cache key of the verifying wallet and account: its slatepack address'''
+    return wallet.get_slatepack_address(0)
+
+
+def verify_proof(wallet, tx, proof, cache=None, wallet_id=None):
+    '''
+    Verify one proof, consulting and filling the cache for confirmed txs.
+    wallet_id: wallet_identity(wallet), looked up when a cache is given without it
+    '''
+    hash_ = proof_hash(proof)
+    result = ProofResult(tx.get('id'), tx.get('tx_slate_id'), bool(tx.get('confirmed')), hash_)
+    cacheable = cache is not None and result.confirmed
+    if cacheable and wallet_id is None:
+        wallet_id = wallet_identity(wallet)
+    if cacheable:
+        cached = cache.get(wallet_id, hash_)
+        if cached is not None:
+            result.sender_mine, result.recipient_mine = cached
+            result.ok = True
+            result.cached = True
+            return result
+    try:
+        result.sender_mine, result.recipient_mine = wallet.verify_payment_proof(proof)
+        result.ok = True
+    except WalletError as e:
+        # Failures are not cached, they may come from the wallet state rather than the proof
+        result.error = e.reason
+        return result
+    if cacheable:
+        cache.put(wallet_id, hash_, result.sender_mine, result.recipient_mine)
+    return result
+
+
+def audit(wallet, txs=None, cache=None, concurrency=4, refresh_from_node=False):
+    '''
+    Fetch and verify the payment proofs of txs (by default every tx log entry
+    that has a payment proof) and yield a ProofResult per tx as soon as it is done.
+    '''
+    if txs is None:
+        txs = [tx for tx in wallet.retrieve_txs(refresh=False) if tx.get('payment_proof')]
+    wallet_id = wallet_identity(wallet) if cache is not None else None
+
+    def check(tx):
+        try:
+            proof = wallet.retrieve_payment_proof(refresh_from_node, tx['id'], None)
+        except WalletError as e:
+            return ProofResult(tx.get('id'), tx.get('tx_slate_id'), bool(tx.get('confirmed')), error=e.reason)
+        return verify_proof(wallet, tx, proof, cache, wallet_id)
+
+    return bounded_map(check, txs, concurrency)
+
+
+def write_report(results, fp, format='jsonl'):
+    '''
+    Stream ProofResults to an open text file as CSV or JSON Lines.
+    Returns (passed, failed) counts.
+    '''
+    passed = failed = 0
+    writer = None
+    if format == 'csv':
+        writer = csv.DictWriter(fp, fieldnames=ProofResult.FIELDS)
+        writer.writeheader()
+    elif format != 'jsonl':
+        raise ValueError(f'Unknown report format {format}')
+    for result in results:
+        row = result.to_dict()
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            fp.write(json.dumps(row) + '\n')
+        if result.ok:
+            passed += 1
+        else:
+            failed += 1
+    fp.flush()
+    return passed, failed
@@ -0,0 +1,201 @@
+# Routines for running long wallet rescans with progress, checkpoints and ETA
+#
+# WalletV3.scan(start_height) is a single blocking call. The orchestrator runs
+# it in a worker thread and meanwhile reads the wallet updater messages to
+# report progress per height window, with an ETA from the measured blocks/sec.
+#
+# The owner API always scans from start_height up to the tip and only stores
+# what it found once the scan completes, so the checkpoint records the tip of
+# the last completed scan. After a crash or restart the next run starts from
+# that height (minus a small reorg margin) instead of height 0; progress of an
+# interrupted scan is kept for reporting but never used as a resume point.
+#
+# usage:
+#   orchestrator = ScanOrchestrator(wallet, '/var/lib/mwc/scan.json',
+#                                   on_progress=lambda p: print(p))
+#   orchestrator.run()
+#
+
+import json, os, threading, time
+
+from mwc.wallet_v3 import WalletError
+
+
+class ScanCheckpoint:
+    def __init__(self, path):
+        self.path = path
+        self.completed_height = None    # tip height of the last completed scan
+        self.blocks_per_sec = None      # measured by the last completed scan
+        self.in_progress = None         # {start_height, tip_height, progress_height, started_at}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            data = json.load(f)
+        self.completed_height = data.get('completed_height')
+        self.blocks_per_sec = data.get('blocks_per_sec')
+        self.in_progress = data.get('in_progress')
+
+    def save(self):
+        data = {
+            'completed_height': self.completed_height,
+            'blocks_per_sec': self.blocks_per_sec,
+            'in_progress': self.in_progress,
+        }
+        # Write to a temporary file first so a crash never leaves a torn checkpoint
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class ScanProgress:
+    def __init__(self, start_height, tip_height, percent=0, message=None, elapsed=0.0, blocks_per_sec=None):
+        self.start_height = start_height
+        self.tip_height = tip_height
+        self.percent = percent
+        self.message = message
+        self.elapsed = elapsed
+        self.blocks_per_sec = blocks_per_sec
+        self.done = False
+
+    @property
+    def total_blocks(self):
+        return max(0, self.tip_height - self.start_height)
+
+    @property
+    def height(self):
+        '''Estimated height reached by the scan'''
+        return self.start_height + int(self.total_blocks * self.percent / 100)
+
+    @property
+    def eta(self):
+        '''Estimated seconds left, None until a rate is known'''
+        if self.done:
+            return 0.0
+        if not self.blocks_per_sec:
+            return None
+        return (self.tip_height - self.height) / self.blocks_per_sec
+
+    def __repr__(self):
+        eta = '?' if self.eta is None else f'{self.eta:.0f}s'
+        return f'ScanProgress({self.percent}%, height {self.height}/{self.tip_height}, eta {eta})'
+
+
+def parse_updater_message(message):
+    '''
+    Updater messages are serialized enums, e.g. {"Scanning": ["...", 42]} or
+    {"ScanningComplete": "..."}. Returns (kind, text, percent or None).
+    '''
+    if not isinstance(message, dict) or len(message) != 1:
+        return None, str(message), None
+    kind, value = next(iter(message.items()))
+    if isinstance(value, list):
+        text = value[0] if value else None
+        percent = value[1] if len(value) > 1 else None
+        return kind, text, percent
+    return kind, value, None
+
+
+class ScanOrchestrator:
+    def __init__(self, wallet, checkpoint_path, window=10000, reorg_margin=10,
+                 poll_interval=2.0, on_progress=None, delete_unconfirmed=False):
+        '''
+        wallet: opened WalletV3
+        checkpoint_path: JSON file holding the scan checkpoint
+        window: progress is reported and checkpointed every window blocks
+        reorg_margin: blocks below the checkpoint that are scanned again on resume
+        on_progress: callback(ScanProgress)
+        '''
+        self.wallet = wallet
+        self.checkpoint = ScanCheckpoint(checkpoint_path)
+        self.window = window
+        self.reorg_margin = reorg_margin
+        self.poll_interval = poll_interval
+        self.on_progress = on_progress
+        self.delete_unconfirmed = delete_unconfirmed
+
+    def resume_height(self):
+        completed = self.checkpoint.completed_height
+        if completed is None:
+            return 0
+        return max(0, completed - self.reorg_margin)
+
+    def _report(self, progress):
+        if self.on_progress is not None:
+            self.on_progress(progress)
+
+    def run(self, start_height=None):
+        '''
+        Scan from start_height, by default from the checkpoint, to the current
+        tip. Returns the final ScanProgress; WalletError from the scan is raised.
+        '''
+        if start_height is None:
+            start_height = self.resume_height()
+        tip_height = int(self.wallet.node_height()['height'])
+        progress = ScanProgress(start_height, tip_height, blocks_per_sec=self.checkpoint.blocks_per_sec)
+
+        checkpoint = self.checkpoint
+        checkpoint.in_progress = {
+            'start_height': start_height,
+            'tip_height': tip_height,
+            'progress_height': start_height,
+            'started_at': time.time(),
+        }
+        checkpoint.save()
+        self._report(progress)
+
+        # Drop messages left over from earlier operations
+        self.wallet.get_updater_messages(1000)
+
+        result = {}
+        def worker():
+            try:
+                self.wallet.scan(start_height, self.delete_unconfirmed)
+            except Exception as e:
+                result['error'] = e
+        thread = threading.Thread(target=worker, name='mwc-scan', daemon=True)
+        started = time.monotonic()
+        thread.start()
+
+        next_window = start_height + self.window
+        while thread.is_alive():
+            thread.join(self.poll_interval)
+            try:
+                messages = self.wallet.get_updater_messages(1000)
+            except WalletError:
+                continue
+            for message in messages:
+                kind, text, percent = parse_updater_message(message)
+                if percent is not None:
+                    progress.percent = max(progress.percent, percent)
+                progress.message = text
+            progress.elapsed = time.monotonic() - started
+            scanned = progress.height - start_height
+            if scanned > 0 and progress.elapsed > 0:
+                progress.blocks_per_sec = scanned / progress.elapsed
+            if progress.height >= next_window:
+                next_window = progress.height - (progress.height - start_height) % self.window + self.window
+                checkpoint.in_progress['progress_height'] = progress.height
+                checkpoint.save()
+                self._report(progress)
+
+        if 'error' in result:
+            checkpoint.save()
+            raise result['error']
+
+        progress.elapsed = time.monotonic() - started
+        progress.percent = 100
+        progress.done = True
+        if progress.total_blocks and progress.elapsed > 0:
+            progress.blocks_per_sec = progress.total_blocks / progress.elapsed
+        checkpoint.completed_height = tip_height
+        checkpoint.blocks_per_sec = progress.blocks_per_sec
+        checkpoint.in_progress = None
+        checkpoint.save()
+        self._report(progress)
+        return progress
@@ -0,0 +1,372 @@
+# Pluggable HTTP transports for NodeV2 and WalletV3
+#
+# Every JSON-RPC call of the clients goes through transport.post(url, payload,
+# auth, secret). Besides the default HttpTransport there are two transports
+# for repeatable benchmarks:
+#
+#   RecordingTransport  wraps another transport and appends every request /
+#                       response pair to a JSON Lines file. Calls over the
+#                       encrypted owner API channel are stored as decrypted
+#                       plaintext, so they can be served again under a new
+#                       session key. Password / mnemonic parameters and the
+#                       results of secret returning methods are redacted.
+#   ReplayTransport     serves a recording locally without any node or wallet,
+#                       with no delay, the recorded delay, or the recorded
+#                       delay scaled by a factor.
+#
+# HttpTransport negotiates compressed responses, decodes them as they stream
+# in and keeps per method bytes-on-wire metrics in transport.stats.
+#
+# usage:
+#   wallet = WalletV3(api_url, api_user, api_password,
+#                     transport=RecordingTransport(HttpTransport(), 'workflow.jsonl'))
+#   ... run the workload ...
+#   wallet = WalletV3(api_url, api_user, api_password,
+#                     transport=ReplayTransport('workflow.jsonl', timing='original'))
+#
+
+import gzip, json, os, threading, time, zlib
+from collections import defaultdict, deque
+
+# Parameters that are never written to a recording
+REDACTED = ('password', 'old', 'new', 'mnemonic')
+# Methods whose result is a secret, recorded as '***'
+SECRET_RESULTS = ('get_mnemonic', 'get_slatepack_secret_key')
+
+
+class Response:
+    '''The part of requests.Response the clients use, plus wire metrics'''
+    def __init__(self, status_code, reason, body, elapsed=0.0, sent_bytes=0, wire_bytes=None, encoding=None):
+        self.status_code = status_code
+        self.reason = reason
+        self.content = body
+        self.elapsed = elapsed
+        self.sent_bytes = sent_bytes        # request body bytes on the wire
+        self.wire_bytes = len(body) if wire_bytes is None else wire_bytes
+        self.encoding = encoding            # Content-Encoding of the response, if any
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class WireStats:
+    '''Per method totals of calls, bytes on the wire and decoded bytes'''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}
+
+    def record(self, method, response):
+        with self.lock:
+            totals = self.methods.get(method)
+            if totals is None:
+                totals = self.methods[method] = [0, 0, 0, 0, 0.0]
+            totals[0] += 1
+            totals[1] += response.sent_bytes
+            totals[2] += response.wire_bytes
+            totals[3] += len(response.content)
+            totals[4] += response.elapsed
+
+    def summary(self):
+        '''method -> dict of calls, sent, received (wire), decoded, ratio and seconds'''
+        with self.lock:
+            return {
+                method: {
+                    'calls': calls,
+                    'bytes_sent': sent,
+                    'bytes_received': wire,
+                    'bytes_decoded': decoded,
+                    'compression_ratio': decoded / wire if wire else None,
+                    'seconds': elapsed,
+                }
+                for method, (calls, sent, wire, decoded, elapsed) in self.methods.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.methods = {}
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+class _ZlibDecoder:
+    # gzip or zlib wrapped deflate, with a fallback for servers sending raw deflate
+    def __init__(self):
+        self.decoder = zlib.decompressobj(zlib.MAX_WBITS | 32)
+        self.started = False
+
+    def decompress(self, data):
+        if not self.started:
+            self.started = True
+            try:
+                return self.decoder.decompress(data)
+            except zlib.error:
+                self.decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self.decoder.decompress(data)
+
+    def flush(self):
+        return self.decoder.flush()
+
+
+class _ZstdDecoder:
+    def __init__(self, zstandard):
+        self.decoder = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data):
+        return self.decoder.decompress(data)
+
+    def flush(self):
+        return b''
+
+
+def _decoder(encoding):
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        return _ZlibDecoder()
+    if encoding == 'zstd':
+        zstandard = _zstd()
+        if zstandard is not None:
+            return _ZstdDecoder(zstandard)
+    return None
+
+
+class HttpTransport:
+    def __init__(self, session=None, timeout=None, compression=True, compress_requests=False,
+                 chunk_size=65536):
+        '''
+        session: optional requests.Session to reuse pooled connections
+        timeout: seconds passed to requests for connect and read
+        compression: ask for gzip/deflate (and zstd when zstandard is
+            installed) compressed responses, decoded while they stream in
+        compress_requests: gzip request bodies; only for servers or proxies
+            that accept Content-Encoding on requests, the mwc node and wallet
+            listeners themselves do not
+        '''
+        self.session = session
+        self.timeout = timeout
+        self.compress_requests = compress_requests
+        self.chunk_size = chunk_size
+        self.stats = WireStats()
+        if compression:
+            encodings = ['gzip', 'deflate']
+            if _zstd() is not None:
+                encodings.insert(0, 'zstd')
+            self.accept_encoding = ', '.join(encodings)
+        else:
+            self.accept_encoding = 'identity'
+
+    def post(self, url, payload, auth, secret=None):
+        http = self.session
+        if http is None:
+            import requests as http
+        body = json.dumps(payload).encode()
+        headers = {'Content-Type': 'application/json', 'Accept-Encoding': self.accept_encoding}
+        if self.compress_requests:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+
+        start = time.monotonic()
+        response = http.post(url, data=body, headers=headers, auth=auth, timeout=self.timeout, stream=True)
+        try:
+            encoding = response.headers.get('Content-Encoding', '').strip().lower() or None
+            decoder = _decoder(encoding)
+            if encoding is not None and decoder is None:
+                # Unknown encoding, let urllib3 deal with it
+                content = response.content
+                wire = len(content)
+            else:
+                wire = 0
+                chunks = []
+                for chunk in response.raw.stream(self.chunk_size, decode_content=False):
+                    wire += len(chunk)
+                    chunks.append(decoder.decompress(chunk) if decoder else chunk)
+                if decoder is not None:
+                    chunks.append(decoder.flush())
+                content = b''.join(chunks)
+        finally:
+            response.close()
+
+        result = Response(response.status_code, response.reason, content, time.monotonic() - start,
+                          sent_bytes=len(body), wire_bytes=wire, encoding=encoding)
+        self.stats.record(payload.get('method'), result)
+        return result
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+_default = None
+
+def default_transport():
+    global _default
+    if _default is None:
+        _default = HttpTransport()
+    return _default
+
+
+def _redact(params):
+    if isinstance(params, dict):
+        return {k: ('***' if k in REDACTED and v is not None else _redact(v)) for k, v in params.items()}
+    return params
+
+
+def _call_key(url, payload):
+    method = payload.get('method')
+    if method == 'init_secure_api':
+        # The client key is new for every session
+        return (url, method, None)
+    return (url, method, json.dumps(_redact(payload.get('params')), sort_keys=True))
+
+
+class RecordingTransport:
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a')
+
+    def post(self, url, payload, auth, secret=None):
+        from mwc.wallet_v3 import decrypt
+        response = self.inner.post(url, payload, auth, secret)
+        entry = {
+            'url': url,
+            'encrypted': False,
+            'request': payload,
+            'status': response.status_code,
+            'reason': response.reason,
+            'elapsed': response.elapsed,
+        }
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        entry['response'] = body
+
+        if payload.get('method') == 'encrypted_request_v3' and secret:
+            # Store the plaintext on both sides so it can be re-encrypted on replay
+            params = payload['params']
+            entry['encrypted'] = True
+            entry['request'] = json.loads(decrypt(secret, params['body_enc'], bytes.fromhex(params['nonce'])))
+            try:
+                ok = body['result']['Ok']
+                entry['response'] = json.loads(decrypt(secret, ok['body_enc'], bytes.fromhex(ok['nonce'])))
+            except (KeyError, TypeError):
+                entry['encrypted_error'] = True
+        request = entry['request']
+        entry['request'] = dict(request, params=_redact(request.get('params')))
+        response_body = entry['response']
+        if (request.get('method') in SECRET_RESULTS and not entry.get('encrypted_error')
+                and isinstance(response_body, dict) and isinstance(response_body.get('result'), dict)
+                and 'Ok' in response_body['result']):
+            entry['response'] = dict(response_body, result={'Ok': '***'})
+
+        with self.lock:
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+        return response
+
+    def close(self):
+        self.file.close()
+        if hasattr(self.inner, 'close'):
+            self.inner.close()
+
+
+class ReplayTransport:
+    def __init__(self, path, timing=None):
+        '''
+        path: recording written by RecordingTransport
+        timing: None to answer immediately, 'original' to wait the recorded
+            time, or a float to wait the recorded time multiplied by it
+        '''
+        self.timing = timing
+        self.lock = threading.Lock()
+        self.secrets = {}                   # url -> shared secret, one channel per listener
+        self.calls = defaultdict(deque)     # call key -> recorded entries in order
+        self.last = {}                      # call key -> last entry, repeated once exhausted
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    key = (entry['encrypted'],) + _call_key(entry['url'], entry['request'])
+                    self.calls[key].append(entry)
+
+    def _delay(self, entry):
+        if self.timing is None:
+            return
+        scale = 1.0 if self.timing == 'original' else float(self.timing)
+        time.sleep(entry.get('elapsed', 0.0) * scale)
+
+    def _next(self, key):
+        with self.lock:
+            queue = self.calls.get(key)
+            if queue:
+                entry = queue.popleft()
+                self.last[key] = entry
+                return entry
+            return self.last.get(key)
+
+    def _missing(self, payload):
+        return {'id': payload.get('id', 1), 'jsonrpc': '2.0',
+                'error': {'code': -32601, 'message': f"No recorded response for {payload.get('method')}"}}
+
+    def post(self, url, payload, auth, secret=None):
+        from mwc.wallet_v3 import encrypt, decrypt
+        method = payload.get('method')
+
+        if method == 'init_secure_api':
+            # Act as the wallet: new server key, shared secret with the client key
+            from coincurve import PrivateKey, PublicKey
+            key = PrivateKey()
+            client = PublicKey(bytes.fromhex(payload['params']['ecdh_pubkey']))
+            with self.lock:
+                self.secrets[url] = client.multiply(key.secret).format().hex()[2:]
+            entry = self._next((False,) + _call_key(url, payload)) or {}
+            self._delay(entry)
+            body = {'id': payload.get('id', 1), 'jsonrpc': '2.0', 'result': {'Ok': key.public_key.format().hex()}}
+            return Response(200, 'OK', json.dumps(body).encode())
+
+        if method == 'encrypted_request_v3':
+            params = payload['params']
+            secret = self.secrets.get(url)
+            if secret is None:
+                body = {'id': payload.get('id', 1), 'jsonrpc': '2.0',
+                        'error': {'code': -32001, 'message': f'No secure channel for {url}, call init_secure_api'}}
+                return Response(200, 'OK', json.dumps(body).encode())
+            inner = json.loads(decrypt(secret, params['body_enc'], bytes.fromhex(params['nonce'])))
+            entry = self._next((True,) + _call_key(url, inner))
+            if entry is None:
+                response = self._missing(inner)
+            else:
+                self._delay(entry)
+                if entry.get('encrypted_error'):
+                    return Response(entry['status'], entry['reason'], json.dumps(entry['response']).encode())
+                response = entry['response']
+            nonce = os.urandom(12)
+            body_enc = encrypt(secret, json.dumps(response), nonce)
+            body = {'id': payload.get('id', 1), 'jsonrpc': '2.0',
+                    'result': {'Ok': {'nonce': nonce.hex(), 'body_enc': body_enc}}}
+            return Response(200, 'OK', json.dumps(body).encode())
+
+        entry = self._next((False,) + _call_key(url, payload))
+        if entry is None:
+            return Response(200, 'OK', json.dumps(self._missing(payload)).encode())
+        self._delay(entry)
+        body = entry['response']
+        return Response(entry['status'], entry['reason'],
+                        json.dumps(body).encode() if body is not None else b'')
+
+    def close(self):
+        pass
@@ -0,0 +1,320 @@
+# Routines for working with many wallets and accounts through one manager
+#
+# A WalletManager keeps a pool of opened wallet sessions keyed by
+# (api url, wallet name, account) on top of one shared transport, by default
+# HTTP over a pooled requests.Session.
+#
+# Two properties of the owner API shape the design:
+#
+#   * the encrypted channel is per owner API listener: init_secure_api replaces
+#     the listener's shared key, so all wallets behind one url share a single
+#     channel set up once.
+#   * the active account is per opened wallet: calls for different accounts of
+#     the same wallet are serialized under a per-wallet lock and
+#     set_active_account is only sent when the account actually changes.
+#     Calls to different wallets or listeners run in parallel.
+#
+# Idle sessions are evicted in LRU order; a wallet is closed once its last
+# session is gone and no call on it is in flight. A WalletSession kept by the
+# caller after its eviction reopens the wallet on its next call. Opening and
+# closing wallets happens outside the manager lock, so a slow call never holds
+# up session lookups.
+#
+# usage:
+#   manager = WalletManager(max_sessions=16)
+#   manager.add_endpoint('http://localhost:3420/v3/owner', 'mwc', api_secret)
+#   manager.add_wallet('http://localhost:3420/v3/owner', None, wallet_password)
+#   manager.session('http://localhost:3420/v3/owner', None, 'savings').retrieve_txs()
+#
+
+import threading, time
+from collections import OrderedDict
+
+from mwc.transport import HttpTransport
+from mwc.wallet_v3 import WalletV3, WalletError
+
+# Owner API calls whose result depends on the active account
+ACCOUNT_SCOPED = frozenset([
+    'retrieve_txs', 'retrieve_outputs', 'retrieve_summary_info', 'cancel_tx', 'scan',
+    'finalize_tx', 'get_stored_tx', 'init_send_tx', 'issue_invoice_tx', 'post_tx',
+    'process_invoice_tx', 'tx_lock_outputs', 'retrieve_payment_proof',
+    'verify_payment_proof', 'get_slatepack_address', 'get_slatepack_secret_key',
+    'encode_slatepack_message', 'decode_slatepack_message', 'slate_from_slatepack_message',
+])
+
+DEFAULT_ACCOUNT = 'default'
+
+
+class _Endpoint:
+    def __init__(self, url, user, password):
+        self.url = url
+        self.user = user
+        self.password = password
+        self.share_secret = None
+        self.lock = threading.Lock()
+
+
+class _OpenWallet:
+    def __init__(self, api_url, name, previous=None):
+        self.api_url = api_url
+        self.name = name
+        self.wallet = None              # opened WalletV3, None until first use
+        self.active_account = DEFAULT_ACCOUNT
+        self.lock = threading.RLock()   # held by account-scoped calls
+        self.open_lock = threading.Lock()
+        self.state = threading.Condition()
+        self.inflight = 0
+        self.closed = False
+        self.done = threading.Event()   # set once close_wallet has been sent
+        self.previous = previous        # handle of the same wallet still closing
+        self.sessions = 0
+
+    def ensure_open(self, manager):
+        if self.wallet is not None:
+            return
+        with self.open_lock:
+            if self.wallet is None:
+                if self.previous is not None:
+                    # Do not let an old close_wallet land after our open_wallet
+                    self.previous.done.wait()
+                    self.previous = None
+                self.wallet = manager._open(self.api_url, self.name)
+
+    def enter(self):
+        with self.state:
+            if self.closed:
+                return False
+            self.inflight += 1
+            return True
+
+    def leave(self):
+        with self.state:
+            self.inflight -= 1
+
+    def retire(self):
+        '''Stop new calls; False while calls are in flight'''
+        with self.state:
+            if self.inflight:
+                return False
+            self.closed = True
+            return True
+
+    def close(self):
+        try:
+            with self.open_lock:
+                if self.wallet is not None:
+                    self.wallet.close_wallet(self.name)
+        except WalletError:
+            pass
+        finally:
+            self.done.set()
+
+
+class WalletSession:
+    '''
+    One (url, wallet name, account) view of an opened wallet. WalletV3 methods
+    are available on it; account-scoped ones run with the account selected.
+    A session that was evicted reopens its wallet on the next call.
+    '''
+    def __init__(self, manager, key, handle):
+        self.manager = manager
+        self.key = key
+        self.handle = handle
+        self.evicted = False
+        self.last_used = time.monotonic()
+
+    @property
+    def account(self):
+        return self.key[2]
+
+    def call(self, method, *args, **kwargs):
+        self.last_used = time.monotonic()
+        while True:
+            handle = self.manager._use(self)
+            if handle.enter():
+                break
+        try:
+            func = getattr(handle.wallet, method)
+            if method not in ACCOUNT_SCOPED:
+                return func(*args, **kwargs)
+            with handle.lock:
+                if handle.active_account != self.account:
+                    handle.wallet.set_active_account(self.account)
+                    handle.active_account = self.account
+                return func(*args, **kwargs)
+        finally:
+            handle.leave()
+
+    def __getattr__(self, method):
+        if method.startswith('_') or not callable(getattr(WalletV3, method, None)):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.call(method, *args, **kwargs)
+
+    def __repr__(self):
+        return f'WalletSession(url={self.key[0]}, name={self.key[1]}, account={self.key[2]})'
+
+
+class WalletManager:
+    def __init__(self, max_sessions=32, idle_timeout=None, pool_size=10, session=None, transport=None):
+        '''
+        max_sessions: sessions kept before the least recently used is evicted
+        idle_timeout: seconds after which an unused session is evicted
+        pool_size: connections kept per host in the shared HTTP pool
+        session: requests.Session to use instead of a new one
+        transport: mwc.transport transport to use instead of HTTP, e.g. a replay
+        '''
+        if transport is None:
+            if session is None:
+                import requests
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+            transport = HttpTransport(session)
+        self.transport = transport
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+
+        # The manager lock only guards these maps, no network call is made under it
+        self.endpoints = {}             # url -> _Endpoint
+        self.passwords = {}             # (url, name) -> wallet password
+        self.wallets = {}               # (url, name) -> _OpenWallet
+        self.retired = {}               # (url, name) -> _OpenWallet being closed
+        self.sessions = OrderedDict()   # (url, name, account) -> WalletSession, LRU order
+        self.lock = threading.RLock()
+
+    def add_endpoint(self, api_url, api_user, api_password):
+        with self.lock:
+            self.endpoints[api_url] = _Endpoint(api_url, api_user, api_password)
+
+    def add_wallet(self, api_url, name, password):
+        with self.lock:
+            self.passwords[(api_url, name)] = password
+
+    def _secure(self, endpoint):
+        # One init_secure_api per listener, shared by every wallet behind it
+        with endpoint.lock:
+            if endpoint.share_secret is None:
+                wallet = WalletV3(endpoint.url, endpoint.user, endpoint.password, transport=self.transport)
+                endpoint.share_secret = wallet.init_secure_api()
+            return endpoint.share_secret
+
+    def _open(self, api_url, name):
+        with self.lock:
+            endpoint = self.endpoints.get(api_url)
+            password = self.passwords.get((api_url, name))
+        if endpoint is None:
+            raise WalletError('open_wallet', {'name': name}, None, f'No endpoint registered for {api_url}')
+        if password is None:
+            raise WalletError('open_wallet', {'name': name}, None, f'No password registered for wallet {name} at {api_url}')
+        wallet = WalletV3(endpoint.url, endpoint.user, endpoint.password, transport=self.transport)
+        wallet.share_secret = self._secure(endpoint)
+        wallet.open_wallet(name, password)
+        return wallet
+
+    def _register(self, key, session=None):
+        # Under the manager lock: find or create the session and its wallet
+        # handle. Returns the session and the handles to close afterwards.
+        with self.lock:
+            retired = self._collect_idle()
+            current = self.sessions.get(key)
+            if current is not None:
+                self.sessions.move_to_end(key)
+                current.last_used = time.monotonic()
+                if session is not None and session is not current:
+                    session.handle = current.handle
+                    session.evicted = False
+                    return session, retired
+                return current, retired
+            wallet_key = (key[0], key[1])
+            handle = self.wallets.get(wallet_key)
+            if handle is None:
+                handle = _OpenWallet(key[0], key[1], previous=self.retired.get(wallet_key))
+                self.wallets[wallet_key] = handle
+            if session is None:
+                session = WalletSession(self, key, handle)
+            else:
+                session.handle = handle
+                session.evicted = False
+            handle.sessions += 1
+            self.sessions[key] = session
+            for old in list(self.sessions):
+                if len(self.sessions) <= self.max_sessions:
+                    break
+                if old != key:
+                    retired += self._evict(old)
+            return session, retired
+
+    def session(self, api_url, name=None, account=DEFAULT_ACCOUNT):
+        '''Return the session for (api_url, name, account), opening the wallet if needed'''
+        session, retired = self._register((api_url, name, account))
+        self._close(retired)
+        session.handle.ensure_open(self)
+        return session
+
+    def _use(self, session):
+        # Handle for the next call of a session, reopening after an eviction
+        handle = session.handle
+        if session.evicted or handle.closed:
+            session, retired = self._register(session.key, session)
+            self._close(retired)
+            handle = session.handle
+        handle.ensure_open(self)
+        return handle
+
+    def call(self, api_url, name, account, method, *args, **kwargs):
+        return self.session(api_url, name, account).call(method, *args, **kwargs)
+
+    def evict_idle(self):
+        with self.lock:
+            retired = self._collect_idle()
+        self._close(retired)
+
+    def _collect_idle(self):
+        if self.idle_timeout is None:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        retired = []
+        for key in [k for k, s in self.sessions.items() if s.last_used < cutoff]:
+            retired += self._evict(key)
+        return retired
+
+    def _evict(self, key):
+        # Drop a session; its wallet is retired once no session uses it and no
+        # call is in flight. Busy wallets keep their session for now.
+        session = self.sessions[key]
+        handle = session.handle
+        if handle.sessions == 1 and not handle.retire():
+            return []
+        del self.sessions[key]
+        session.evicted = True
+        handle.sessions -= 1
+        if handle.sessions:
+            return []
+        wallet_key = (key[0], key[1])
+        del self.wallets[wallet_key]
+        self.retired[wallet_key] = handle
+        return [handle]
+
+    def _close(self, handles):
+        # close_wallet outside the manager lock
+        for handle in handles:
+            handle.close()
+            with self.lock:
+                wallet_key = (handle.api_url, handle.name)
+                if self.retired.get(wallet_key) is handle:
+                    del self.retired[wallet_key]
+
+    def close(self):
+        '''Close every opened wallet and the shared transport, once calls in flight are done'''
+        retired = []
+        while True:
+            with self.lock:
+                for key in list(self.sessions):
+                    retired += self._evict(key)
+                busy = bool(self.sessions)
+            if not busy:
+                break
+            time.sleep(0.05)
+        self._close(retired)
+        self.transport.close()
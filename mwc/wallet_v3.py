@@ -3,21 +3,25 @@
 # Routines for working with mwc Wallet Owner API V3
 #
 
-import os, requests, json
-from requests.auth import HTTPBasicAuth
-from ecies.utils import generate_key
-from coincurve import PrivateKey, PublicKey
-from Crypto.Cipher import AES
+import os, json
 import base64
 
+from mwc.transport import HttpTransport, default_transport
+
+# The HTTP and crypto stacks are imported where they are first used, so that
+# importing this module stays cheap for callers that never reach the
+# encrypted API.
+
 def encrypt(key, msg, nonce):
     '''key hex string; msg string; nonce 12bit bytes'''
+    from Crypto.Cipher import AES
     aes_cipher = AES.new(bytes.fromhex(key), AES.MODE_GCM, nonce=nonce)
     msg = str.encode(msg)
     ciphertext, auth_tag = aes_cipher.encrypt_and_digest(msg)
     return base64.b64encode(ciphertext + auth_tag).decode()
 
 def decrypt(key, data, nonce):
+    from Crypto.Cipher import AES
     data = base64.b64decode(data)
     ciphertext = data[:-16]
     auth_tag = data[-16:]
@@ -41,25 +45,39 @@ class WalletError(Exception):
 
 # mwc Wallet Owner API V3
 class WalletV3:
-    def __init__(self, api_url, api_user, api_password):
+    def __init__(self, api_url, api_user, api_password, session=None, transport=None):
         self.api_url = api_url
         self.api_user = api_user
         self.api_password = api_password
+        # mwc.transport transport, by default plain HTTP through requests;
+        # a requests.Session given as session is wrapped in an HttpTransport
+        if transport is None and session is not None:
+            transport = HttpTransport(session)
+        self.transport = transport
 
-        self.key = generate_key()
+        self._key = None
         self.share_secret = ''
         self.token = ''
 
-    def post(self, method, params):
+    @property
+    def key(self):
+        # Ephemeral ECDH key, generated on first init_secure_api
+        if self._key is None:
+            from ecies.utils import generate_key
+            self._key = generate_key()
+        return self._key
+
+    def post(self, method, params, secret=None):
         payload = {
             'jsonrpc': '2.0',
             'id': 1,
             'method': method,
             'params': params
         }
-        response = requests.post(
-                self.api_url, json=payload,
-                auth=(self.api_user, self.api_password))
+        transport = self.transport or default_transport()
+        response = transport.post(
+                self.api_url, payload,
+                (self.api_user, self.api_password), secret)
         if response.status_code >= 300 or response.status_code < 200:
             # Requests-level error
             raise WalletError(method, params, response.status_code, response.reason)
@@ -85,7 +103,7 @@ class WalletV3:
         resp = self.post('encrypted_request_v3', {
             'nonce': nonce.hex(),
             'body_enc': encrypted
-        })
+        }, self.share_secret)
         nonce2 = bytes.fromhex(resp['result']['Ok']['nonce'])
         encrypted2 = resp['result']['Ok']['body_enc']
         response_json = json.loads(decrypt(self.share_secret, encrypted2, nonce2))
@@ -103,6 +121,7 @@ class WalletV3:
 
     # https://docs.rs/mwc_wallet_api/5.3.4/mwc_wallet_api/trait.OwnerRpcV3.html#tymethod.init_secure_api
     def init_secure_api(self):
+        from coincurve import PublicKey
         pubkey = self.key.public_key.format().hex()
         resp = self.post('init_secure_api', {'ecdh_pubkey': pubkey})
         remote_pubkey = resp['result']['Ok']
@@ -3,7 +3,7 @@ import setuptools
 setuptools.setup(
     name='mwcmw.py',
     version='0.1.1',
-    packages=['mwcmw.py'],
+    packages=['mwc'],
     license='MIT',
     description = 'Python wrappers around the MWC wallet V3 and MWC node V2 APIs',
     long_description=open('README.md').read(),
@@ -11,6 +11,14 @@ setuptools.setup(
     author = 'MWC Developers',
     author_email = 'info@mwc.mw',
     install_requires=['requests', 'eciespy', 'coincurve', 'Crypto'],
+    extras_require={
+        'analytics': ['numpy'],
+        'parquet': ['pyarrow'],
+        'zstd': ['zstandard'],
+    },
+    entry_points={
+        'console_scripts': ['mwcmw=mwc.cli:main'],
+    },
     url = 'https://github.com/mwcproject/mwcmw.py.py',
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,94 @@
+import unittest
+
+try:
+    import numpy as np
+    from mwc import analytics
+except ImportError:
+    np = None
+
+from mwc.models import parse_outputs, parse_txs
+
+
+def output(value, height, status, lock_height=0, is_coinbase=False):
+    return {'commit': '08' + '00' * 32, 'output': {
+        'commit': '08' + '00' * 32, 'value': str(value), 'height': str(height), 'lock_height': str(lock_height),
+        'status': status, 'is_coinbase': is_coinbase, 'mmr_index': None, 'n_child': 0,
+        'key_id': '03' + '00' * 16, 'root_key_id': '02' + '00' * 16, 'tx_log_entry': None}}
+
+
+def tx(id_, tx_type, credited, debited, fee, created, confirmed=True):
+    return {'id': id_, 'tx_type': tx_type, 'confirmed': confirmed, 'amount_credited': str(credited),
+            'amount_debited': str(debited), 'fee': None if fee is None else str(fee), 'num_inputs': 1,
+            'num_outputs': 1, 'tx_slate_id': None, 'kernel_excess': None, 'kernel_lookup_min_height': None,
+            'output_height': None, 'ttl_cutoff_height': None, 'parent_key_id': '02' + '00' * 16,
+            'creation_ts': created, 'confirmation_ts': None, 'messages': None, 'payment_proof': None,
+            'stored_tx': None}
+
+
+OUTPUTS = [
+    output(100, 1000, 'Unspent'),
+    output(200, 995, 'Unspent'),
+    output(300, 0, 'Unconfirmed'),
+    output(400, 998, 'Unspent', lock_height=1440, is_coinbase=True),
+    output(500, 900, 'Locked'),
+    output(600, 800, 'Spent'),
+]
+
+TXS = [
+    tx(1, 'TxReceived', 1000, 0, None, '2024-03-01T10:00:00.5+00:00'),
+    tx(2, 'TxSent', 100, 600, 10, '2024-03-01T23:59:59+00:00'),
+    tx(3, 'TxSent', 0, 300, 7, '2024-03-02T00:00:01+00:00', confirmed=False),
+    tx(4, 'SomethingNew', 5, 0, None, None),
+]
+
+
+@unittest.skipIf(np is None, 'numpy not installed')
+class TestAnalytics(unittest.TestCase):
+
+    def test_dicts_and_records_agree(self):
+        from_dicts = analytics.outputs_to_array(OUTPUTS)
+        from_records = analytics.outputs_to_array(parse_outputs(OUTPUTS))
+        self.assertEqual(from_dicts.tolist(), from_records.tolist())
+        self.assertEqual(analytics.txs_to_array(TXS).tolist(), analytics.txs_to_array(parse_txs(TXS)).tolist())
+
+    def test_balances(self):
+        outputs = analytics.outputs_to_array(OUTPUTS)
+        self.assertEqual(analytics.balance_by_status(outputs),
+                         {'Unconfirmed': 300, 'Unspent': 700, 'Locked': 500, 'Spent': 600})
+        self.assertEqual(analytics.balance(outputs, 1000, minimum_confirmations=3),
+                         {'spendable': 200, 'immature': 400, 'awaiting_confirmation': 400, 'locked': 500})
+
+    def test_histograms(self):
+        outputs = analytics.outputs_to_array(OUTPUTS)
+        self.assertEqual(analytics.confirmation_depths(outputs, 1000).tolist(), [1, 6, 0, 3, 101, 201])
+        counts, values, edges = analytics.age_histogram(outputs, 1000, bins=(0, 5, 100))
+        self.assertEqual(counts.tolist(), [2, 1, 0])
+        self.assertEqual(values.tolist(), [500, 200, 0])
+        self.assertEqual(analytics.confirmation_histogram(outputs, 1000, max_depth=5).tolist(),
+                         [1, 1, 0, 1, 0, 3])
+        self.assertEqual(outputs['value'][analytics.small_outputs(outputs, 250)].tolist(), [100, 200])
+
+    def test_tx_aggregates(self):
+        txs = analytics.txs_to_array(TXS)
+        self.assertEqual(analytics.fee_total(txs), 10)
+        self.assertEqual(analytics.fee_total(txs, confirmed_only=False), 17)
+        self.assertEqual(analytics.totals_by_type(txs), {
+            'TxReceived': {'count': 1, 'credited': 1000, 'debited': 0},
+            'TxSent': {'count': 2, 'credited': 100, 'debited': 900},
+        })
+        self.assertEqual(analytics.status_names(txs['tx_type'], analytics.TX_TYPES).tolist(),
+                         ['TxReceived', 'TxSent', 'TxSent', 'Unknown'])
+        days, credited, debited = analytics.daily_volume(txs)
+        self.assertEqual([str(d) for d in days], ['2024-03-01', '2024-03-02'])
+        self.assertEqual(credited.tolist(), [1100, 0])
+        self.assertEqual(debited.tolist(), [600, 300])
+
+    def test_empty_inputs(self):
+        outputs = analytics.outputs_to_array([])
+        self.assertEqual(len(outputs), 0)
+        self.assertEqual(analytics.balance(outputs, 10)['spendable'], 0)
+        self.assertEqual(analytics.age_histogram(outputs, 10)[0].sum(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from mwc import chain_watcher
+from mwc.chain_watcher import ChainWatcher, ChainEvent
+from mwc.confirmations import ConfirmationTracker
+from mwc.node_v2 import NodeError
+
+
+class FakeNode:
+    '''Chain of headers by branch name; get_block can be told to fail'''
+    def __init__(self, height):
+        self.chain = []
+        self.by_hash = {}
+        self.kernels = {}       # hash -> kernel excesses of the block
+        self.fail_blocks = set()
+        self.extend(height + 1, 'a')
+
+    def extend(self, count, branch):
+        for _ in range(count):
+            height = len(self.chain)
+            previous = self.chain[-1]['hash'] if self.chain else None
+            header = {'height': height, 'hash': f'{branch}{height}', 'previous': previous}
+            self.chain.append(header)
+            self.by_hash[header['hash']] = header
+
+    def fork(self, fork_height, count, branch):
+        del self.chain[fork_height + 1:]
+        self.extend(count, branch)
+
+    def get_status(self):
+        tip = self.chain[-1]
+        return {'tip': {'height': tip['height'], 'last_block_pushed': tip['hash']}}
+
+    def get_header(self, height=None, hash_=None, commit=None):
+        return self.by_hash[hash_] if hash_ is not None else self.chain[height]
+
+    def get_block(self, height=None, hash_=None, commit=None):
+        if hash_ in self.fail_blocks:
+            self.fail_blocks.discard(hash_)
+            raise NodeError('get_block', [height, hash_, commit], None, 'temporarily unavailable', 'foreign')
+        header = self.by_hash[hash_] if hash_ is not None else self.chain[height]
+        return {'header': header, 'kernels': [{'excess': e} for e in self.kernels.get(header['hash'], [])]}
+
+
+def describe(events):
+    return [(e.kind, e.height, e.fork_height if e.kind == ChainEvent.REORG else e.hash) for e in events]
+
+
+class TestChainWatcher(unittest.TestCase):
+
+    def test_new_blocks_in_order(self):
+        node = FakeNode(10)
+        watcher = ChainWatcher(node)
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.height, 10)
+        node.extend(3, 'a')
+        self.assertEqual(describe(watcher.poll()),
+                         [('new_block', 11, 'a11'), ('new_block', 12, 'a12'), ('new_block', 13, 'a13')])
+        self.assertEqual(watcher.poll(), [])
+
+    def test_reorg_comes_before_new_branch(self):
+        node = FakeNode(10)
+        watcher = ChainWatcher(node, start_height=5)
+        watcher.poll()
+        node.fork(7, 4, 'b')
+        events = watcher.poll()
+        self.assertEqual(describe(events), [
+            ('reorg', 11, 7),
+            ('new_block', 8, 'b8'), ('new_block', 9, 'b9'), ('new_block', 10, 'b10'), ('new_block', 11, 'b11'),
+        ])
+        self.assertEqual(events[0].depth, 3)
+        self.assertEqual([h['hash'] for h in events[0].detached], ['a8', 'a9', 'a10'])
+        self.assertEqual(watcher.tip['hash'], 'b11')
+
+    def test_failing_subscriber_gets_events_again(self):
+        node = FakeNode(10)
+        watcher = ChainWatcher(node)
+        watcher.poll()
+        seen, flaky_seen, errors = [], [], []
+        failures = {11}
+
+        def flaky(event):
+            if event.height in failures:
+                failures.discard(event.height)
+                raise RuntimeError('busy')
+            flaky_seen.append(event.height)
+
+        watcher.subscribe(flaky)
+        watcher.subscribe(lambda event: seen.append(event.height))
+        watcher.on_error = lambda exception, event, callback: errors.append(event.height)
+
+        node.extend(2, 'a')
+        self.assertEqual(describe(watcher.poll()), [('new_block', 11, 'a11'), ('new_block', 12, 'a12')])
+        self.assertEqual(seen, [11, 12])
+        self.assertEqual(flaky_seen, [])
+        self.assertEqual(errors, [11])
+
+        # No new block: the backlog is still delivered, in order
+        watcher.poll()
+        self.assertEqual(flaky_seen, [11, 12])
+        self.assertEqual(seen, [11, 12])
+
+    def test_events_retry_transport_errors(self):
+        node = FakeNode(10)
+        get_status = node.get_status
+        failures = [requests.ConnectionError('node restarting'), requests.Timeout('read timed out')]
+
+        def flaky_status():
+            if failures:
+                raise failures.pop(0)
+            return get_status()
+        node.get_status = flaky_status
+        errors = []
+        watcher = ChainWatcher(node, start_height=8,
+                               on_error=lambda exception, event, callback: errors.append(type(exception)))
+        with mock.patch.object(chain_watcher.time, 'sleep') as sleep:
+            events = watcher.events()
+            self.assertEqual([next(events).height, next(events).height], [9, 10])
+        self.assertEqual(errors, [requests.ConnectionError, requests.Timeout])
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_tracker_survives_transient_block_error(self):
+        node = FakeNode(10)
+        watcher = ChainWatcher(node)
+        watcher.poll()
+        confirmed = []
+        tracker = ConfirmationTracker(node, watcher)
+        tracker.track('08aa', confirmations=2,
+                      callback=lambda excess, height, confirmations: confirmed.append((excess, height)))
+
+        node.extend(1, 'a')
+        node.kernels['a11'] = ['08aa']
+        node.fail_blocks.add('a11')
+        watcher.poll()
+        self.assertEqual(tracker.confirmations('08aa'), 0)
+
+        node.extend(1, 'a')
+        watcher.poll()
+        self.assertEqual(confirmed, [('08aa', 11)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+from unittest import mock
+
+from mwc import cli
+from mwc.transport import Response
+from mwc.wallet_v3 import WalletV3, WalletError
+
+
+class FakeWallet:
+    '''Owner API stand-in: init_send_tx outcome per destination'''
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.sent = []
+
+    def post_encrypted(self, wallet, method, params):
+        if method == 'open_wallet':
+            return {'result': {'Ok': 'token'}}
+        if method == 'init_send_tx':
+            dest = params['args']['send_args']['dest']
+            self.sent.append(dest)
+            outcome = self.outcomes.get(dest)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return {'result': {'Ok': {'id': 'slate-' + dest}}}
+        return {'result': {'Ok': None}}
+
+
+class TestPayoutsRun(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.csv = os.path.join(self.dir.name, 'payouts.csv')
+        with open(self.csv, 'w') as f:
+            f.write('id,address,amount\nA,ok,1.5\nB,gateway,0.25\nC,refused,1\n')
+        self.wallet = FakeWallet({
+            'gateway': WalletError('encrypted_request_v3', {}, 502, 'Bad Gateway'),
+            'refused': WalletError('init_send_tx', {}, -32099, 'NotEnoughFunds'),
+        })
+        env = {'MWCMW_WALLET_PASSWORD': 'pw', 'MWCMW_WALLET_API_PASSWORD': 'secret',
+               'MWCMW_CONFIG': os.path.join(self.dir.name, 'none.ini')}
+        self.patches = [
+            mock.patch.dict(os.environ, env),
+            mock.patch.object(cli, 'http_transport', lambda concurrency: mock.Mock()),
+            mock.patch.object(WalletV3, 'init_secure_api', lambda wallet: 'ab' * 32),
+            mock.patch.object(WalletV3, 'post_encrypted',
+                              lambda wallet, method, params: self.wallet.post_encrypted(wallet, method, params)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.dir.cleanup()
+
+    def run_payouts(self):
+        out = io.StringIO()
+        with redirect_stdout(out), redirect_stderr(io.StringIO()):
+            status = cli.main(['payouts', 'run', self.csv, '-c', '1'])
+        return status, {r['id']: r for r in map(json.loads, out.getvalue().splitlines())}
+
+    def test_http_errors_are_unknown(self):
+        status, results = self.run_payouts()
+        self.assertEqual(status, 1)
+        self.assertEqual(results['A']['status'], 'sent')
+        self.assertEqual(results['B']['status'], 'unknown')
+        self.assertEqual(results['C']['status'], 'failed')
+
+    def test_rerun_skips_sent_and_unknown(self):
+        self.run_payouts()
+        self.wallet.sent = []
+        status, results = self.run_payouts()
+        self.assertEqual(self.wallet.sent, ['refused'])
+        self.assertEqual(results['A']['status'], 'skipped')
+        self.assertEqual(results['B']['status'], 'skipped')
+        self.assertEqual(results['B']['previous'], 'unknown')
+        self.assertEqual(results['C']['status'], 'failed')
+
+
+class FakeNodeTransport:
+    '''Node API stand-in: kernels by excess, tip height from get_status'''
+    def __init__(self):
+        self.calls = []
+
+    def post(self, url, payload, auth, secret=None):
+        self.calls.append((url, payload['method'], auth))
+        if payload['method'] == 'get_status':
+            result = {'tip': {'height': 3}}
+        elif payload['method'] == 'get_kernel':
+            result = {'height': 5, 'mmr_index': 9} if payload['params'][0] == '08aa' else None
+        else:
+            header = {'height': payload['params'][0], 'hash': '00', 'previous': '00', 'timestamp': 't',
+                      'total_difficulty': 1, 'secondary_scaling': 0, 'edge_bits': 31}
+            result = {'header': header, 'inputs': [], 'outputs': [], 'kernels': []}
+        return Response(200, 'OK', json.dumps({'id': 1, 'jsonrpc': '2.0', 'result': {'Ok': result}}).encode())
+
+    def close(self):
+        pass
+
+
+class TestNodeCommands(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.transport = FakeNodeTransport()
+        # No owner secret anywhere and no terminal to ask on
+        env = {'MWCMW_CONFIG': os.path.join(self.dir.name, 'none.ini'),
+               'MWCMW_NODE_FOREIGN_PASSWORD': 'foreign',
+               'MWCMW_NODE_SECRET_FILE': os.path.join(self.dir.name, 'missing')}
+        self.patches = [
+            mock.patch.dict(os.environ, env),
+            mock.patch.object(cli, 'http_transport', lambda concurrency: self.transport),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.dir.cleanup()
+
+    def run_cli(self, argv):
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            status = cli.main(argv)
+        return status, [json.loads(line) for line in out.getvalue().splitlines()], err.getvalue()
+
+    def test_foreign_commands_need_no_owner_secret(self):
+        kernels = os.path.join(self.dir.name, 'kernels.txt')
+        with open(kernels, 'w') as f:
+            f.write('08aa\n08bb\n')
+        status, records, _ = self.run_cli(['kernels', 'check', kernels, '-c', '1'])
+        self.assertEqual(status, 1)
+        self.assertEqual([(r['excess'], r['found']) for r in records], [('08aa', True), ('08bb', False)])
+
+        status, records, _ = self.run_cli(['blocks', 'export', '--from', '1', '--to', '2', '-c', '1'])
+        self.assertEqual(status, 0)
+        self.assertEqual([r['height'] for r in records], [1, 2])
+        self.assertEqual({method for _, method, _ in self.transport.calls}, {'get_kernel', 'get_block'})
+
+    def test_owner_secret_read_on_first_owner_call(self):
+        status, _, err = self.run_cli(['blocks', 'export', '--from', '1', '-c', '1'])
+        self.assertEqual(status, 2)
+        self.assertIn('MWCMW_NODE_PASSWORD', err)
+        with mock.patch.dict(os.environ, {'MWCMW_NODE_PASSWORD': 'owner'}):
+            status, records, _ = self.run_cli(['blocks', 'export', '--from', '1', '-c', '1'])
+        self.assertEqual(status, 0)
+        self.assertEqual(len(records), 3)
+        self.assertIn(('http://localhost:3413/v2/owner', 'get_status', ('mwcmain', 'owner')), self.transport.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+
+from mwc.chain_watcher import ChainEvent
+from mwc.confirmations import ConfirmationTracker
+
+
+class FakeNode:
+    '''Blocks by height, each a list of kernel excesses'''
+    def __init__(self):
+        self.blocks = {}
+        self.fetched = []
+
+    def get_block(self, height=None, hash_=None, commit=None):
+        if hash_ is not None:
+            height = int(hash_[1:])
+        self.fetched.append(height)
+        return {'header': {'height': height}, 'kernels': [{'excess': e} for e in self.blocks.get(height, [])]}
+
+    def get_kernel(self, excess, min_height, max_height):
+        for height in sorted(self.blocks):
+            if height >= min_height and excess in self.blocks[height]:
+                return {'height': height, 'mmr_index': 1, 'tx_kernel': {'excess': excess}}
+        return None
+
+
+class TestConfirmationTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.node = FakeNode()
+        self.confirmed = []
+        self.tracker = ConfirmationTracker(
+            self.node, on_confirmed=lambda excess, height, n: self.confirmed.append((excess, height, n)))
+
+    def blocks(self, first, last):
+        for height in range(first, last + 1):
+            self.tracker.add_block(height)
+
+    def test_confirmed_after_required_blocks(self):
+        self.tracker.track('08aa', confirmations=3)
+        self.tracker.track('08bb', confirmations=1)
+        self.node.blocks[101] = ['08aa', '08cc']
+        self.node.blocks[102] = ['08bb']
+        self.blocks(100, 102)
+        self.assertEqual(self.confirmed, [('08bb', 102, 1)])
+        self.assertEqual(self.tracker.confirmations('08aa'), 2)
+        self.blocks(103, 104)
+        self.assertEqual(self.confirmed, [('08bb', 102, 1), ('08aa', 101, 3)])
+        self.assertEqual(self.tracker.pending, {})
+        self.assertEqual(self.tracker.included, {})
+        self.assertEqual(self.node.fetched, [100, 101, 102, 103, 104])
+
+    def test_reorg_moves_kernel_to_new_height(self):
+        self.tracker.track('08aa', confirmations=3)
+        self.node.blocks[101] = ['08aa']
+        self.blocks(100, 102)
+        self.node.blocks = {103: ['08aa']}
+        self.tracker.handle_event(ChainEvent(ChainEvent.REORG, 102, depth=2, fork_height=100))
+        self.assertEqual(self.tracker.confirmations('08aa'), 0)
+        # The stale heap entry for height 101 must not fire
+        for height in (101, 102, 103, 104):
+            self.tracker.handle_event(ChainEvent(ChainEvent.NEW_BLOCK, height, {'hash': f'b{height}'}))
+        self.assertEqual(self.confirmed, [])
+        self.tracker.add_block(105)
+        self.assertEqual(self.confirmed, [('08aa', 103, 3)])
+
+    def test_untrack(self):
+        self.tracker.track('08aa', confirmations=2)
+        self.node.blocks[100] = ['08aa']
+        self.blocks(100, 100)
+        self.tracker.untrack('08aa')
+        self.blocks(101, 102)
+        self.assertEqual(self.confirmed, [])
+        self.assertEqual(self.tracker.included, {})
+
+    def test_min_height_catches_up(self):
+        self.node.blocks[90] = ['08aa']
+        self.blocks(95, 95)
+        self.tracker.track('08aa', confirmations=10, min_height=80)
+        self.assertEqual(self.tracker.confirmations('08aa'), 6)
+        self.blocks(96, 99)
+        self.assertEqual(self.confirmed, [('08aa', 90, 10)])
+
+    def test_block_during_catch_up_lookup(self):
+        self.node.blocks[100] = ['08aa']
+        self.blocks(99, 99)
+        get_kernel = self.node.get_kernel
+
+        def slow_get_kernel(excess, min_height, max_height):
+            # The watcher delivers the block while the lookup is in flight
+            self.tracker.add_block(100)
+            return get_kernel(excess, min_height, max_height)
+        self.node.get_kernel = slow_get_kernel
+        self.tracker.track('08aa', confirmations=2, min_height=90)
+        self.assertEqual(len(self.tracker.due), 1)
+        self.blocks(101, 103)
+        self.assertEqual(self.confirmed, [('08aa', 100, 2)])
+
+    def test_callback_may_track_more(self):
+        tracker = self.tracker
+        tracker.on_confirmed = lambda excess, height, n: (self.confirmed.append(excess),
+                                                          tracker.track('08bb', confirmations=1))
+        tracker.track('08aa', confirmations=1)
+        self.node.blocks[100] = ['08aa']
+        self.node.blocks[101] = ['08bb']
+        self.blocks(100, 101)
+        self.assertEqual(self.confirmed, ['08aa', '08bb'])
+
+
+if __name__ == '__main__':
+    unittest.main()
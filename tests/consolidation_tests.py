@@ -0,0 +1,149 @@
+import datetime
+import unittest
+
+from mwc.consolidation import (ConsolidationBatch, ConsolidationPlanner, ConsolidationExecutor,
+                               tx_fee, in_windows)
+from mwc.wallet_v3 import WalletError
+
+MWC = 1000000000
+
+
+def output(n, value, height=100, status='Unspent', lock_height=0):
+    commit = f'08{n:064x}'
+    return {'commit': commit, 'output': {
+        'commit': commit, 'value': str(value), 'height': str(height), 'lock_height': str(lock_height),
+        'status': status, 'is_coinbase': False, 'mmr_index': None, 'n_child': n,
+        'key_id': '03' + '00' * 16, 'root_key_id': '02' + '00' * 16, 'tx_log_entry': None}}
+
+
+class FakeWallet:
+    def __init__(self, height=200):
+        self.height = height
+        self.sends = []
+        self.fail = {}
+        self.lookup_error = None
+        self.txs = {}
+
+    def node_height(self):
+        return {'height': str(self.height), 'header_hash': '00', 'updated_from_node': True}
+
+    def init_send_tx(self, args):
+        n = len(self.sends)
+        self.sends.append(args)
+        if n in self.fail:
+            raise self.fail[n]
+        slate_id = f'slate-{n}'
+        self.txs[slate_id] = {'tx_slate_id': slate_id, 'tx_type': 'TxSent', 'confirmed': False,
+                              'kernel_excess': f'09{n:064x}', 'output_height': None}
+        return {'id': slate_id}
+
+    def retrieve_txs(self, tx_id=None, tx_slate_id=None, refresh=True):
+        if self.lookup_error is not None:
+            raise self.lookup_error
+        return [self.txs[tx_slate_id]] if tx_slate_id in self.txs else []
+
+    def retrieve_outputs(self, include_spent=False, refresh=True, tx_id=None):
+        return []
+
+
+class FakeTracker:
+    def __init__(self):
+        self.tracked = []
+
+    def track(self, excess, confirmations=10, callback=None, min_height=None):
+        self.tracked.append((excess, min_height))
+        callback(excess, min_height + 1, confirmations)
+
+
+class TestPlanner(unittest.TestCase):
+
+    def test_tx_fee(self):
+        self.assertEqual(tx_fee(1), 4 * 1000000)
+        self.assertEqual(tx_fee(400), 1000000)
+        self.assertEqual(tx_fee(3, num_outputs=2, base_fee=10), 60)
+
+    def test_plan_batches(self):
+        outputs = [output(n, (n + 1) * MWC // 100) for n in range(25)]
+        outputs += [output(100, MWC // 1000, height=195),           # not enough confirmations
+                    output(101, MWC // 1000, status='Locked'),
+                    output(102, MWC // 1000, lock_height=500),
+                    output(103, 10 * MWC)]                           # above the dust threshold
+        planner = ConsolidationPlanner(max_inputs=10, min_inputs=5, dust_threshold=MWC)
+        batches = planner.plan(outputs, 200)
+        self.assertEqual([len(b.inputs) for b in batches], [10, 10, 5])
+        values = [o.value for b in batches for o in b.inputs]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(batches[0].fee, tx_fee(10))
+        self.assertEqual(batches[0].amount, sum(values[:10]) - tx_fee(10))
+        self.assertEqual(len(ConsolidationPlanner(max_inputs=10, max_batches=2, min_inputs=5).plan(outputs, 200)), 2)
+        self.assertEqual(len(ConsolidationPlanner(max_inputs=10, min_inputs=6, dust_threshold=MWC).plan(outputs, 200)), 2)
+
+    def test_dust_below_fee_is_dropped(self):
+        outputs = [output(n, 1000) for n in range(10)]
+        self.assertEqual(ConsolidationPlanner(min_inputs=1).plan(outputs, 200), [])
+
+    def test_windows(self):
+        at = lambda hour, minute=0: datetime.datetime(2024, 1, 1, hour, minute)
+        self.assertTrue(in_windows(None, at(12)))
+        self.assertTrue(in_windows([(1, 5)], at(4, 59)))
+        self.assertFalse(in_windows([(1, 5)], at(5)))
+        self.assertTrue(in_windows([(22, 4)], at(23)))
+        self.assertTrue(in_windows([(22, 4)], at(3)))
+        self.assertFalse(in_windows([(22, 4)], at(12)))
+
+
+class TestExecutor(unittest.TestCase):
+
+    def batches(self, count):
+        return [ConsolidationBatch([], 0) for _ in range(count)]
+
+    def test_send_records_height_and_failures(self):
+        wallet = FakeWallet()
+        wallet.fail = {1: WalletError('init_send_tx', {}, -32099, 'NotEnoughFunds'),
+                       2: WalletError('encrypted_request_v3', {}, 502, 'Bad Gateway'),
+                       3: ConnectionError('connection reset')}
+        executor = ConsolidationExecutor(wallet, 'http://localhost:3415')
+        report = executor.run(self.batches(4), wait=False)
+        batches = report.batches
+        self.assertEqual([b.status for b in batches], [ConsolidationBatch.SENT, ConsolidationBatch.FAILED,
+                                                       ConsolidationBatch.UNKNOWN, ConsolidationBatch.UNKNOWN])
+        self.assertEqual(batches[0].sent_height, 200)
+        self.assertEqual(batches[0].kernel_excess, f'09{0:064x}')
+        self.assertEqual(wallet.sends[0]['send_args']['dest'], 'http://localhost:3415')
+        self.assertIsInstance(batches[1].error, WalletError)
+        self.assertIsInstance(batches[3].error, ConnectionError)
+        self.assertIn('1 failed, 2 unknown', report.summary())
+
+    def test_failed_lookup_after_post_is_still_sent(self):
+        wallet = FakeWallet()
+        wallet.lookup_error = WalletError('retrieve_txs', {}, 502, 'Bad Gateway')
+        batch = ConsolidationExecutor(wallet, 'http://localhost:3415').send(ConsolidationBatch([], 0))
+        self.assertEqual(batch.status, ConsolidationBatch.SENT)
+        self.assertEqual(batch.slate_id, 'slate-0')
+        self.assertIsNone(batch.kernel_excess)
+
+    def test_tracker_looks_up_from_sent_height(self):
+        wallet = FakeWallet()
+        tracker = FakeTracker()
+        executor = ConsolidationExecutor(wallet, 'http://localhost:3415', tracker=tracker)
+        first = executor.send(ConsolidationBatch([], 0))
+        wallet.height = 260
+        second = executor.send(ConsolidationBatch([], 0))
+        executor.wait_confirmed([first, second], timeout=1)
+        self.assertEqual([h for _, h in tracker.tracked], [200, 260])
+        self.assertEqual([first.status, second.status], [ConsolidationBatch.CONFIRMED] * 2)
+
+    def test_polling_until_confirmed(self):
+        wallet = FakeWallet()
+        executor = ConsolidationExecutor(wallet, 'http://localhost:3415', confirmations=3, poll_interval=0)
+        report = executor.run(self.batches(2), wait=False)
+        wallet.txs['slate-0'].update(confirmed=True, output_height=198)
+        wallet.txs['slate-1']['tx_type'] = 'TxSentCancelled'
+        executor.wait_confirmed(report.batches)
+        self.assertEqual([b.status for b in report.batches],
+                         [ConsolidationBatch.CONFIRMED, ConsolidationBatch.FAILED])
+        self.assertIn('1 confirmed, 0 unconfirmed, 1 failed', report.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
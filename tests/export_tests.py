@@ -0,0 +1,117 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from mwc.export import (TX_FIELDS, BLOCK_FIELDS, CsvWriter, JsonLinesWriter, ParquetWriter,
+                        HighWaterMarks, export_txs, export_blocks)
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+def tx(id_, **fields):
+    record = {'id': id_, 'tx_type': 'TxReceived', 'confirmed': True, 'amount_credited': '1000',
+              'amount_debited': '0', 'fee': None, 'messages': None, 'payment_proof': None,
+              'ttl_cutoff_height': None}
+    record.update(fields)
+    return record
+
+
+class FakeWallet:
+    def __init__(self, txs):
+        self.txs = txs
+
+    def retrieve_txs(self, refresh=True):
+        return list(self.txs)
+
+
+class FakeNode:
+    def get_status(self):
+        return {'tip': {'height': 24}}
+
+    def get_block(self, height=None):
+        header = {'height': height, 'hash': f'{height:064x}', 'previous': f'{height - 1:064x}',
+                  'timestamp': '2024-01-01T00:00:00+00:00', 'total_difficulty': height * 10,
+                  'secondary_scaling': 1, 'edge_bits': 31}
+        return {'header': header, 'inputs': [], 'outputs': [{}],
+                'kernels': [{'excess': f'08{height:064x}', 'fee': '1000'}]}
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_incremental_csv(self):
+        marks = HighWaterMarks(self.path('state.json'))
+        wallet = FakeWallet([tx(2), tx(1)])
+        with CsvWriter(self.path('txs.csv'), TX_FIELDS, append=True) as writer:
+            self.assertEqual(export_txs(wallet, writer, marks), 2)
+        wallet.txs.append(tx(3))
+        marks = HighWaterMarks(self.path('state.json'))
+        with CsvWriter(self.path('txs.csv'), TX_FIELDS, append=True) as writer:
+            self.assertEqual(export_txs(wallet, writer, marks), 1)
+        with open(self.path('txs.csv'), newline='') as f:
+            self.assertEqual([row['id'] for row in csv.DictReader(f)], ['1', '2', '3'])
+        self.assertEqual(marks.get('txs'), 3)
+
+    def test_incremental_txs_wait_for_pending(self):
+        marks = HighWaterMarks(self.path('state.json'))
+        wallet = FakeWallet([tx(1), tx(2, confirmed=False, tx_type='TxSent'), tx(3)])
+        with JsonLinesWriter(self.path('txs.jsonl'), ('id', 'confirmed')) as writer:
+            self.assertEqual(export_txs(wallet, writer, marks), 1)
+            self.assertEqual(marks.get('txs'), 1)
+            wallet.txs[1] = tx(2, confirmed=False, tx_type='TxSentCancelled')
+            wallet.txs.append(tx(4, confirmed=False, tx_type='TxSent'))
+            self.assertEqual(export_txs(wallet, writer, marks), 2)
+        self.assertEqual(marks.get('txs'), 3)
+        with open(self.path('txs.jsonl')) as f:
+            self.assertEqual([json.loads(line)['id'] for line in f], [1, 2, 3])
+
+    def test_jsonl_nested_values(self):
+        with JsonLinesWriter(self.path('txs.jsonl'), ('id', 'messages')) as writer:
+            writer.write(tx(1, messages={'messages': []}))
+        with open(self.path('txs.jsonl')) as f:
+            self.assertEqual(json.loads(f.read()), {'id': 1, 'messages': {'messages': []}})
+
+    @unittest.skipIf(pq is None, 'pyarrow not installed')
+    def test_parquet_schema_with_null_first_group(self):
+        with ParquetWriter(self.path('txs'), TX_FIELDS, row_group_size=2) as writer:
+            writer.write(tx(1))
+            writer.write(tx(2))
+            writer.write(tx(3, fee='800000', ttl_cutoff_height=1200, payment_proof={'a': 1}))
+        table = pq.read_table(self.path('txs'))
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column('fee').to_pylist(), [None, None, 800000])
+        self.assertEqual(table.column('payment_proof').to_pylist(), [None, None, '{"a":1}'])
+
+    @unittest.skipIf(pq is None, 'pyarrow not installed')
+    def test_parquet_parts_complete_at_every_mark(self):
+        marks = HighWaterMarks(self.path('state.json'))
+        saved = []
+        original = marks.save
+
+        def save():
+            # Everything up to the mark must already be readable
+            saved.append((marks.get('blocks'), pq.read_table(self.path('blocks')).num_rows))
+            original()
+        marks.save = save
+
+        with ParquetWriter(self.path('blocks'), BLOCK_FIELDS, row_group_size=10) as writer:
+            self.assertEqual(export_blocks(FakeNode(), writer, marks, concurrency=2), 25)
+        self.assertEqual(saved, [(9, 10), (19, 20), (24, 25)])
+        self.assertFalse([p for p in os.listdir(self.path('blocks')) if p.endswith('.tmp')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import unittest
+
+from mwc.chain_watcher import ChainEvent
+from mwc.header_store import HeaderStore, HeaderStoreError, sync_headers
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def header(height, branch, previous):
+    return {'height': height, 'hash': f'{branch}{height:063x}', 'previous': previous,
+            'timestamp': f'2024-01-01T00:{height // 60 % 60:02d}:{height % 60:02d}+00:00',
+            'total_difficulty': 10 * height, 'secondary_scaling': 1856, 'version': 2, 'edge_bits': 31}
+
+
+class FakeNode:
+    '''Header chain; branch is the first hex digit of every hash'''
+    def __init__(self, height):
+        self.chain = []
+        self.on_fetch = None
+        self.extend(height + 1, 'a')
+
+    def extend(self, count, branch):
+        for _ in range(count):
+            previous = self.chain[-1]['hash'] if self.chain else None
+            self.chain.append(header(len(self.chain), branch, previous))
+
+    def fork(self, fork_height, count, branch):
+        del self.chain[fork_height + 1:]
+        self.extend(count, branch)
+
+    def get_status(self):
+        return {'tip': {'height': len(self.chain) - 1}}
+
+    def get_header(self, height=None, hash_=None, commit=None):
+        if self.on_fetch is not None:
+            self.on_fetch(height)
+        return self.chain[height]
+
+
+class TestHeaderStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'headers.bin')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_extend_truncate_reopen(self):
+        node = FakeNode(9)
+        with HeaderStore(self.path) as store:
+            self.assertIsNone(store.height)
+            store.extend(node.chain[:5], 0)
+            with self.assertRaises(HeaderStoreError):
+                store.extend(node.chain[6:], 6)
+            store.extend(node.chain[5:], 5)
+            store.truncate(6)
+        with HeaderStore(self.path, readonly=True) as store:
+            self.assertEqual(store.height, 6)
+            self.assertEqual(store.hash(6), node.chain[6]['hash'])
+            self.assertEqual(store.timestamp(6), 1704067206)
+            self.assertEqual(store.get(3)['total_difficulty'], 30)
+            self.assertEqual(store.height_of(node.chain[2]['hash']), 2)
+            self.assertIsNone(store.height_of(node.chain[8]['hash']))
+            with self.assertRaises(IndexError):
+                store.hash(7)
+            with self.assertRaises(HeaderStoreError):
+                store.append(node.chain[7])
+
+    def test_sync_rolls_back_to_fork(self):
+        node = FakeNode(2500)
+        with HeaderStore(self.path) as store:
+            batches = []
+            self.assertEqual(sync_headers(node, store, concurrency=4, batch_size=1000,
+                                          on_batch=lambda s: batches.append(s.height)), 2501)
+            self.assertEqual(batches, [999, 1999, 2500])
+            node.fork(2490, 15, 'b')
+            self.assertEqual(sync_headers(node, store, concurrency=4), 15)
+            self.assertEqual(store.height, 2505)
+            self.assertEqual(store.hash(2490), node.chain[2490]['hash'])
+            self.assertEqual([store.hash(h) for h in range(2491, 2506)],
+                             [h['hash'] for h in node.chain[2491:]])
+
+    def test_sync_to_lower_end_height_keeps_headers(self):
+        node = FakeNode(999)
+        with HeaderStore(self.path) as store:
+            sync_headers(node, store, concurrency=4)
+            self.assertEqual(sync_headers(node, store, end_height=500), 0)
+            self.assertEqual(store.height, 999)
+            node.fork(700, 400, 'b')
+            self.assertEqual(sync_headers(node, store, end_height=500), 0)
+            self.assertEqual(store.height, 700)
+
+    def test_sync_restarts_when_node_switches_branch(self):
+        node = FakeNode(30)
+        forked = []
+
+        def fork_once(height):
+            if height == 25 and not forked:
+                forked.append(height)
+                node.fork(20, 10, 'c')
+        node.on_fetch = fork_once
+        with HeaderStore(self.path) as store:
+            sync_headers(node, store, concurrency=1, batch_size=10)
+            self.assertEqual(store.height, 30)
+            self.assertEqual([store.hash(h) for h in range(31)], [h['hash'] for h in node.chain])
+
+    def test_handle_event(self):
+        node = FakeNode(5)
+        with HeaderStore(self.path) as store:
+            store.extend(node.chain, 0)
+            node.fork(3, 3, 'b')
+            store.handle_event(ChainEvent(ChainEvent.NEW_BLOCK, 6, node.chain[6]))
+            self.assertEqual(store.height, 5)
+            store.handle_event(ChainEvent(ChainEvent.REORG, 6, depth=2, fork_height=3))
+            self.assertEqual(store.height, 3)
+            for h in (4, 5, 6):
+                store.handle_event(ChainEvent(ChainEvent.NEW_BLOCK, h, node.chain[h]))
+            self.assertEqual(store.hash(6), node.chain[6]['hash'])
+
+    @unittest.skipIf(np is None, 'numpy not installed')
+    def test_array_view(self):
+        node = FakeNode(99)
+        with HeaderStore(self.path) as store:
+            store.extend(node.chain, 0)
+            headers = store.array()
+            self.assertEqual(len(headers), 100)
+            self.assertEqual(headers['total_difficulty'][42], 420)
+            self.assertEqual(headers['hash'][7].hex(), node.chain[7]['hash'])
+            self.assertTrue((np.diff(headers['timestamp']) == 1).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['mwc.node_v2', 'mwc.wallet_v3', 'mwc.transport', 'mwc.models', 'mwc.chain_watcher',
+           'mwc.confirmations', 'mwc.limits', 'mwc.wallet_manager', 'mwc.payment_proofs',
+           'mwc.export', 'mwc.scan', 'mwc.consolidation', 'mwc.header_store', 'mwc.cli']
+
+# Only loaded on the first call that needs them
+HEAVY = ['requests', 'ecies', 'coincurve', 'Crypto']
+
+
+def run(code):
+    '''Run code in a fresh interpreter and return what it printed as JSON'''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    proc = subprocess.run([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE, check=True,
+                          universal_newlines=True)
+    return json.loads(proc.stdout)
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_modules_do_not_load_heavy_packages(self):
+        for module in MODULES:
+            loaded = run(f'import json, sys, {module}\n'
+                         f'print(json.dumps([p for p in {HEAVY!r} if p in sys.modules]))')
+            self.assertEqual(loaded, [], module)
+
+    def test_wallet_key_is_generated_on_demand(self):
+        result = run('import json, sys\n'
+                     'from mwc.node_v2 import NodeV2\n'
+                     'from mwc.wallet_v3 import WalletV3\n'
+                     'wallet = WalletV3("http://localhost:3420/v3/owner", "mwc", "secret")\n'
+                     'node = NodeV2("http://n/v2/foreign", None, None, "http://n/v2/owner", None, None)\n'
+                     f'print(json.dumps([wallet._key is None, [p for p in {HEAVY!r} if p in sys.modules]]))')
+        self.assertEqual(result, [True, []])
+
+
+if __name__ == '__main__':
+    unittest.main()
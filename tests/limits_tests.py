@@ -0,0 +1,127 @@
+import unittest
+from unittest import mock
+
+from mwc import limits
+from mwc.limits import AdaptiveLimiter, TokenBucket, LimitedTransport, limit
+from mwc.transport import Response
+
+
+class FakeClock:
+    '''Stands in for the time module: sleep advances monotonic'''
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+class FakeTransport:
+    def __init__(self, statuses, clock, latency=0.01):
+        self.statuses = list(statuses)
+        self.clock = clock
+        self.latency = latency
+
+    def post(self, url, payload, auth, secret=None):
+        self.clock.now += self.latency
+        status = self.statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        return Response(status, 'x', b'{}')
+
+
+class TestLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patch = mock.patch.object(limits, 'time', self.clock)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def calls(self, limiter, latency, count, ok=True):
+        for _ in range(count):
+            self.assertTrue(limiter.acquire())
+            self.clock.now += latency
+            limiter.release(latency, ok=ok)
+
+    def test_additive_increase(self):
+        limiter = AdaptiveLimiter(initial=4, max_limit=6)
+        # One round of calls at the current limit adds about one slot
+        self.calls(limiter, 0.01, 4)
+        self.assertAlmostEqual(limiter.limit, 5.0, delta=0.2)
+        self.calls(limiter, 0.01, 100)
+        self.assertEqual(limiter.limit, 6)
+
+    def test_backoff_once_per_burst(self):
+        limiter = AdaptiveLimiter(initial=16)
+        self.calls(limiter, 0.01, 10)
+        before = limiter.limit
+        # A burst of slow calls completing together halves the limit once
+        for _ in range(5):
+            limiter.acquire()
+        for _ in range(5):
+            limiter.release(0.05)
+        self.assertAlmostEqual(limiter.limit, before / 2)
+        self.clock.now += 1.0
+        self.calls(limiter, 0.01, 1, ok=False)
+        self.assertAlmostEqual(limiter.limit, before / 4)
+
+    def test_baseline_does_not_drift_with_queueing(self):
+        limiter = AdaptiveLimiter(window=10)
+        self.calls(limiter, 0.01, 10)
+        self.assertEqual(limiter.baseline, 0.01)
+        # Slower calls only replace the baseline after a full window of them
+        self.calls(limiter, 0.015, 9)
+        self.assertEqual(limiter.baseline, 0.01)
+        self.calls(limiter, 0.015, 1)
+        self.assertEqual(limiter.baseline, 0.015)
+
+    def test_acquire_times_out_at_limit(self):
+        limiter = AdaptiveLimiter(initial=1)
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire(timeout=0))
+        limiter.release(0.01)
+        self.assertTrue(limiter.acquire(timeout=0))
+
+    def test_token_bucket_rate(self):
+        bucket = TokenBucket(rate=8, burst=4)
+        for _ in range(24):
+            bucket.acquire()
+        # The burst is free, the other 20 calls need 2.5 seconds of tokens
+        self.assertAlmostEqual(self.clock.slept, 2.5)
+
+    def test_overload_responses(self):
+        limiter = AdaptiveLimiter(initial=8)
+        inner = FakeTransport([200, 429, 200, 503, 200, ConnectionError('reset')], self.clock)
+        transport = LimitedTransport(inner, limiter)
+        limits_seen = []
+        for _ in range(5):
+            transport.post('http://node', {}, None)
+            limits_seen.append(limiter.limit)
+            self.clock.now += 1.0
+        with self.assertRaises(ConnectionError):
+            transport.post('http://node', {}, None)
+        self.assertEqual(limiter.inflight, 0)
+        self.assertGreater(limits_seen[0], 8)
+        self.assertAlmostEqual(limits_seen[1], limits_seen[0] / 2)
+        self.assertAlmostEqual(limits_seen[3], limits_seen[2] / 2)
+        self.assertAlmostEqual(limiter.limit, limits_seen[4] / 2)
+
+    def test_limit_wraps_client_transport(self):
+        class Client:
+            transport = FakeTransport([200], self.clock)
+        client = Client()
+        inner = client.transport
+        transport = limit(client, rate=5)
+        self.assertIs(client.transport, transport)
+        self.assertIs(transport.inner, inner)
+        self.assertIsInstance(transport.limiter, AdaptiveLimiter)
+        self.assertEqual(transport.bucket.rate, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from datetime import datetime, timezone
+
+from mwc.header_store import pack_header
+from mwc.models import OutputCommit, TxLogEntry, BlockHeader, Block, parse_outputs, parse_txs
+
+OUTPUT = {
+    'commit': '08' + 'ab' * 32,
+    'output': {
+        'commit': '08' + 'ab' * 32, 'value': '2000000000', 'height': '1036985', 'lock_height': '0',
+        'status': 'Unspent', 'is_coinbase': False, 'mmr_index': 4711, 'n_child': 3,
+        'key_id': '03' + '00' * 16, 'root_key_id': '02' + '00' * 16, 'tx_log_entry': 12,
+    },
+}
+
+TX = {
+    'id': 12, 'tx_type': 'TxReceived', 'confirmed': True, 'amount_credited': '2000000000',
+    'amount_debited': '0', 'fee': None, 'num_inputs': 0, 'num_outputs': 1,
+    'tx_slate_id': '0436430c-2b02-624c-2032-570501212b00', 'kernel_excess': '09' + 'cd' * 32,
+    'kernel_lookup_min_height': 1036980, 'output_height': 1036985, 'ttl_cutoff_height': None,
+    'parent_key_id': '02' + '00' * 16, 'creation_ts': '2019-11-11T16:43:31.123456789+00:00',
+    'confirmation_ts': None, 'messages': {'messages': [{'id': '0', 'message': 'thanks'}]},
+    'payment_proof': None, 'stored_tx': None, 'reverted_after': None,
+}
+
+HEADER = {
+    'height': 1036985, 'hash': '00' + '11' * 31, 'previous': '00' + '22' * 31, 'version': 2,
+    'timestamp': '2022-05-04T10:20:30+00:00', 'total_difficulty': 123456789, 'secondary_scaling': 1856,
+    'edge_bits': 31, 'nonce': 42, 'output_mmr_size': 100, 'kernel_mmr_size': 50,
+    'prev_root': '33' * 32, 'output_root': '44' * 32, 'range_proof_root': '55' * 32,
+    'kernel_root': '66' * 32, 'total_kernel_offset': '77' * 32, 'cuckoo_solution': [1, 2, 3, 2 ** 40],
+}
+
+
+class TestModels(unittest.TestCase):
+
+    def test_output_round_trip(self):
+        output = parse_outputs([OUTPUT])[0]
+        self.assertEqual(output.raw, OUTPUT)
+        self.assertEqual(output.value, 2000000000)
+        self.assertEqual(output.get('height'), '1036985')
+        self.assertEqual(output.get('commit'), OUTPUT['commit'])
+        self.assertEqual(output.get('missing', 'x'), 'x')
+        self.assertTrue(output.is_spendable(1036995, minimum_confirmations=10))
+        self.assertFalse(output.is_spendable(1036993, minimum_confirmations=10))
+
+    def test_tx_round_trip(self):
+        tx = parse_txs([TX])[0]
+        self.assertEqual(tx.raw, TX)
+        for key in TX:
+            self.assertEqual(tx.get(key, 'default'), TX[key], key)
+        self.assertEqual(tx.get('unknown', 'default'), 'default')
+        self.assertEqual(tx.messages, TX['messages'])
+        self.assertEqual(tx.net_amount, 2000000000)
+
+    def test_timestamp_decoded_once(self):
+        tx = TxLogEntry.from_api(TX)
+        created = tx.creation_ts
+        self.assertEqual(created, datetime(2019, 11, 11, 16, 43, 31, 123456, tzinfo=timezone.utc))
+        self.assertIs(tx.creation_ts, created)
+        self.assertIsNone(tx.confirmation_ts)
+        # The original string, nanoseconds included, is what goes back out
+        self.assertEqual(tx.get('creation_ts'), TX['creation_ts'])
+
+    def test_header_round_trip(self):
+        header = BlockHeader.from_api(HEADER)
+        self.assertEqual(header.raw, HEADER)
+        self.assertEqual(header, BlockHeader.from_api(dict(HEADER)))
+        self.assertEqual(header.cuckoo_solution, HEADER['cuckoo_solution'])
+        self.assertEqual(pack_header(header), pack_header(HEADER))
+
+    def test_block_keeps_body(self):
+        data = {'header': HEADER, 'inputs': [], 'outputs': [], 'kernels': [{'excess': '09' + 'cd' * 32}]}
+        block = Block.from_api(data)
+        self.assertEqual(block.raw, data)
+        self.assertEqual(block.kernel_excesses, ['09' + 'cd' * 32])
+        self.assertEqual(block.height, 1036985)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from mwc.payment_proofs import ProofCache, audit, bounded_map, write_report
+from mwc.wallet_v3 import WalletError
+
+
+class FakeWallet:
+    def __init__(self, address, sender_mine, recipient_mine):
+        self.address = address
+        self.flags = (sender_mine, recipient_mine)
+        self.verified = 0
+        self.txs = [
+            {'id': 1, 'tx_slate_id': 's1', 'confirmed': True, 'payment_proof': {'p': 1}},
+            {'id': 2, 'tx_slate_id': 's2', 'confirmed': False, 'payment_proof': {'p': 2}},
+            {'id': 3, 'tx_slate_id': 's3', 'confirmed': True, 'payment_proof': {'p': 3}},
+        ]
+
+    def get_slatepack_address(self, derivation_index=0):
+        return self.address
+
+    def retrieve_txs(self, refresh=True):
+        return self.txs
+
+    def retrieve_payment_proof(self, refresh_from_node, tx_id, tx_slate_id):
+        return {'proof': tx_id}
+
+    def verify_payment_proof(self, proof):
+        self.verified += 1
+        if proof['proof'] == 3:
+            raise WalletError('verify_payment_proof', proof, None, 'invalid signature')
+        return self.flags
+
+
+class TestPaymentProofs(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = ProofCache(os.path.join(self.dir.name, 'proofs.sqlite'))
+
+    def tearDown(self):
+        self.cache.close()
+        self.dir.cleanup()
+
+    def results(self, wallet):
+        return {r.tx_id: r for r in audit(wallet, cache=self.cache, concurrency=2)}
+
+    def test_cache_skips_confirmed_proofs(self):
+        wallet = FakeWallet('mwc1sender', True, False)
+        first = self.results(wallet)
+        self.assertEqual(wallet.verified, 3)
+        second = self.results(wallet)
+        # Confirmed and valid is cached; unconfirmed and failed are verified again
+        self.assertEqual(wallet.verified, 5)
+        self.assertTrue(second[1].cached)
+        self.assertEqual((second[1].sender_mine, second[1].recipient_mine), (True, False))
+        self.assertFalse(second[2].cached)
+        self.assertFalse(first[3].ok)
+        self.assertEqual(first[3].error, 'invalid signature')
+
+    def test_cache_is_per_wallet(self):
+        sender = FakeWallet('mwc1sender', True, False)
+        recipient = FakeWallet('mwc1recipient', False, True)
+        self.results(sender)
+        result = self.results(recipient)[1]
+        self.assertFalse(result.cached)
+        self.assertEqual((result.sender_mine, result.recipient_mine), (False, True))
+
+    def test_other_tables_are_left_alone(self):
+        self.cache.close()
+        path = os.path.join(self.dir.name, 'shared.sqlite')
+        db = sqlite3.connect(path)
+        with db:
+            db.execute('CREATE TABLE proofs (id INTEGER)')
+            db.execute('INSERT INTO proofs VALUES (1)')
+        db.close()
+        self.cache = ProofCache(path)
+        self.assertEqual(self.cache.db.execute('SELECT id FROM proofs').fetchall(), [(1,)])
+
+    def test_report_counts(self):
+        out = io.StringIO()
+        passed, failed = write_report(audit(FakeWallet('mwc1x', True, False)), out, 'csv')
+        self.assertEqual((passed, failed), (2, 1))
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+    def test_bounded_map_yields_everything(self):
+        self.assertEqual(sorted(bounded_map(lambda x: x * 2, range(50), 3)), [x * 2 for x in range(50)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from mwc.scan import ScanCheckpoint, ScanOrchestrator, ScanProgress, parse_updater_message
+from mwc.wallet_v3 import WalletError
+
+
+class FakeWallet:
+    '''scan() runs until every scripted batch of updater messages was read'''
+    def __init__(self, height, batches, error=None):
+        self.height = height
+        self.batches = [[{'Scanning': ['left over', 99]}]] + batches
+        self.error = error
+        self.finished = threading.Event()
+        self.scans = []
+
+    def node_height(self):
+        return {'height': str(self.height)}
+
+    def scan(self, start_height=0, delete_unconfirmed=False):
+        self.scans.append(start_height)
+        self.finished.wait(5)
+        if self.error is not None:
+            raise self.error
+        return True
+
+    def get_updater_messages(self, count=1):
+        if not self.batches:
+            self.finished.set()
+            return []
+        batch = self.batches.pop(0)
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+
+def scanning(percent):
+    return {'Scanning': [f'Checking {percent}%', percent]}
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'scan.json')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_parse_updater_message(self):
+        self.assertEqual(parse_updater_message({'Scanning': ['Checking', 42]}), ('Scanning', 'Checking', 42))
+        self.assertEqual(parse_updater_message({'ScanningComplete': 'done'}), ('ScanningComplete', 'done', None))
+        self.assertEqual(parse_updater_message({'Warning': []}), ('Warning', None, None))
+        self.assertEqual(parse_updater_message('plain'), (None, 'plain', None))
+
+    def test_progress_eta(self):
+        progress = ScanProgress(1000, 11000, percent=25)
+        self.assertEqual(progress.height, 3500)
+        self.assertIsNone(progress.eta)
+        progress.blocks_per_sec = 500
+        self.assertEqual(progress.eta, 15.0)
+        progress.done = True
+        self.assertEqual(progress.eta, 0.0)
+
+    def test_checkpoint_round_trip(self):
+        checkpoint = ScanCheckpoint(self.path)
+        self.assertIsNone(checkpoint.completed_height)
+        checkpoint.completed_height = 1200
+        checkpoint.blocks_per_sec = 350.5
+        checkpoint.save()
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+        loaded = ScanCheckpoint(self.path)
+        self.assertEqual((loaded.completed_height, loaded.blocks_per_sec, loaded.in_progress), (1200, 350.5, None))
+
+    def test_run_reports_windows_and_resumes(self):
+        reports = []
+        wallet = FakeWallet(10000, [[scanning(10)], [scanning(35), scanning(30)], WalletError('get_updater_messages', {}, None, 'busy'),
+                                    [scanning(60)], [{'ScanningComplete': 'done'}]])
+        orchestrator = ScanOrchestrator(wallet, self.path, window=2000, poll_interval=0.01,
+                                        on_progress=lambda p: reports.append((p.percent, p.done)))
+        progress = orchestrator.run()
+        self.assertTrue(progress.done)
+        self.assertEqual(wallet.scans, [0])
+        # Start, every 2000 block window crossed, completion; the left over message is ignored
+        self.assertEqual(reports, [(0, False), (35, False), (60, False), (100, True)])
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['completed_height'], 10000)
+
+        wallet = FakeWallet(10500, [])
+        orchestrator = ScanOrchestrator(wallet, self.path, reorg_margin=10, poll_interval=0.01)
+        self.assertEqual(orchestrator.resume_height(), 9990)
+        orchestrator.run()
+        self.assertEqual(wallet.scans, [9990])
+
+    def test_failed_scan_keeps_checkpoint(self):
+        checkpoint = ScanCheckpoint(self.path)
+        checkpoint.completed_height = 5000
+        checkpoint.save()
+        wallet = FakeWallet(9000, [[scanning(50)]], error=WalletError('scan', {}, -32099, 'node went away'))
+        orchestrator = ScanOrchestrator(wallet, self.path, window=1000, poll_interval=0.01)
+        with self.assertRaises(WalletError):
+            orchestrator.run()
+        checkpoint = ScanCheckpoint(self.path)
+        self.assertEqual(checkpoint.completed_height, 5000)
+        self.assertEqual(checkpoint.in_progress['start_height'], 4990)
+        self.assertEqual(checkpoint.in_progress['progress_height'], 6995)
+
+
+if __name__ == '__main__':
+    unittest.main()
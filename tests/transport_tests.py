@@ -0,0 +1,157 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+import zlib
+
+from mwc.node_v2 import NodeV2
+from mwc.transport import HttpTransport, RecordingTransport, ReplayTransport
+from mwc.wallet_v3 import WalletV3
+
+WALLET_A = 'http://wallet-a:3420/v3/owner'
+WALLET_B = 'http://wallet-b:3420/v3/owner'
+
+
+def entry(url, method, params, result, encrypted=True):
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params}
+    return {'url': url, 'encrypted': encrypted, 'request': request, 'status': 200, 'reason': 'OK',
+            'elapsed': 0.0, 'response': {'id': 1, 'jsonrpc': '2.0', 'result': {'Ok': result}}}
+
+
+class TestReplayTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'recording.jsonl')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, entries):
+        with open(self.path, 'w') as f:
+            for e in entries:
+                f.write(json.dumps(e) + '\n')
+
+    def test_one_channel_per_listener(self):
+        txs_params = {'token': '', 'refresh_from_node': False, 'tx_id': None, 'tx_slate_id': None}
+        self.write([
+            entry(WALLET_A, 'init_secure_api', {'ecdh_pubkey': '02aa'}, '02bb', encrypted=False),
+            entry(WALLET_B, 'init_secure_api', {'ecdh_pubkey': '02cc'}, '02dd', encrypted=False),
+            entry(WALLET_A, 'retrieve_txs', txs_params, [True, [{'id': 1}]]),
+            entry(WALLET_B, 'retrieve_txs', txs_params, [True, [{'id': 2}]]),
+        ])
+        transport = ReplayTransport(self.path)
+        a = WalletV3(WALLET_A, 'mwc', 'x', transport=transport)
+        b = WalletV3(WALLET_B, 'mwc', 'x', transport=transport)
+        a.init_secure_api()
+        b.init_secure_api()
+        self.assertEqual(a.retrieve_txs(refresh=False), [{'id': 1}])
+        self.assertEqual(b.retrieve_txs(refresh=False), [{'id': 2}])
+
+    def test_recording_redacts_secrets(self):
+        phrase = 'abandon ability able about above absent absorb abstract absurd abuse access accident'
+        self.write([
+            entry(WALLET_A, 'init_secure_api', {'ecdh_pubkey': '02aa'}, '02bb', encrypted=False),
+            entry(WALLET_A, 'get_mnemonic', {'name': None, 'password': '***'}, phrase),
+        ])
+        out = os.path.join(self.dir.name, 'out.jsonl')
+        transport = RecordingTransport(ReplayTransport(self.path), out)
+        wallet = WalletV3(WALLET_A, 'mwc', 'x', transport=transport)
+        wallet.init_secure_api()
+        self.assertEqual(wallet.get_mnemonic('wallet password'), phrase)
+        transport.close()
+        with open(out) as f:
+            recorded = f.read()
+        self.assertNotIn(phrase, recorded)
+        self.assertNotIn('wallet password', recorded)
+
+    def test_session_kwarg_wraps_http_transport(self):
+        session = object()
+        wallet = WalletV3(WALLET_A, 'mwc', 'x', session=session)
+        node = NodeV2('http://node:3413/v2/foreign', None, None, 'http://node:3413/v2/owner', None, None, session)
+        for client in (wallet, node):
+            self.assertIsInstance(client.transport, HttpTransport)
+            self.assertIs(client.transport.session, session)
+        self.write([])
+        replay = ReplayTransport(self.path)
+        self.assertIs(WalletV3(WALLET_A, 'mwc', 'x', session=session, transport=replay).transport, replay)
+
+
+class FakeRaw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, chunk_size, decode_content=True):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+
+class FakeHttpResponse:
+    def __init__(self, body, encoding=None):
+        self.status_code = 200
+        self.reason = 'OK'
+        self.headers = {'Content-Encoding': encoding} if encoding else {}
+        self.raw = FakeRaw(body)
+        self.content = body
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    '''requests.Session stand-in answering with a prepared body and encoding'''
+    def __init__(self):
+        self.requests = []
+        self.response = None
+
+    def post(self, url, data=None, headers=None, auth=None, timeout=None, stream=False):
+        self.requests.append((data, headers))
+        return self.response
+
+    def answer(self, body, encoding=None):
+        self.response = FakeHttpResponse(body, encoding)
+
+
+def raw_deflate(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class TestHttpTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.session = FakeSession()
+        self.body = json.dumps({'id': 1, 'jsonrpc': '2.0', 'result': {'Ok': ['x' * 40] * 500}}).encode()
+        self.payload = {'jsonrpc': '2.0', 'id': 1, 'method': 'get_blocks', 'params': []}
+
+    def test_decodes_streamed_encodings(self):
+        transport = HttpTransport(self.session, chunk_size=1000)
+        for encoding, body in (('gzip', gzip.compress(self.body)), ('deflate', zlib.compress(self.body)),
+                               ('deflate', raw_deflate(self.body)), (None, self.body)):
+            self.session.answer(body, encoding)
+            response = transport.post('http://node', self.payload, None)
+            self.assertEqual(response.content, self.body, encoding)
+            self.assertEqual(response.wire_bytes, len(body))
+            self.assertEqual(response.encoding, encoding)
+            self.assertTrue(self.session.response.closed)
+        self.assertIn('gzip', self.session.requests[0][1]['Accept-Encoding'])
+
+        stats = transport.stats.summary()['get_blocks']
+        self.assertEqual(stats['calls'], 4)
+        self.assertEqual(stats['bytes_decoded'], 4 * len(self.body))
+        self.assertGreater(stats['compression_ratio'], 1)
+
+    def test_request_compression_and_identity(self):
+        transport = HttpTransport(self.session, compression=False, compress_requests=True)
+        self.session.answer(self.body)
+        transport.post('http://node', self.payload, None)
+        data, headers = self.session.requests[0]
+        self.assertEqual(headers['Accept-Encoding'], 'identity')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(data)), self.payload)
+
+
+if __name__ == '__main__':
+    unittest.main()
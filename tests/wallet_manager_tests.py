@@ -0,0 +1,107 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from mwc.wallet_manager import WalletManager
+from mwc.wallet_v3 import WalletV3
+
+URL = 'http://localhost:3420/v3/owner'
+
+
+class FakeOwnerApi:
+    '''Records owner API calls per wallet; scan blocks until released'''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.tokens = 0
+        self.open = {}                  # token -> wallet name
+        self.scan_started = threading.Event()
+        self.scan_release = threading.Event()
+
+    def post_encrypted(self, wallet, method, params):
+        with self.lock:
+            self.calls.append(method)
+            if method == 'open_wallet':
+                self.tokens += 1
+                token = f'token{self.tokens}'
+                self.open[token] = params['name']
+                return {'result': {'Ok': token}}
+            if method == 'close_wallet':
+                self.open = {t: n for t, n in self.open.items() if n != params['name']}
+                return {'result': {'Ok': None}}
+            if params.get('token') not in self.open:
+                return {'error': {'code': -32099, 'message': 'invalid token'}}
+        if method == 'scan':
+            self.scan_started.set()
+            self.scan_release.wait(5)
+        if method == 'retrieve_txs':
+            return {'result': {'Ok': [True, [{'id': 1, 'wallet': self.open[params['token']]}]]}}
+        return {'result': {'Ok': None}}
+
+
+class TestWalletManager(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeOwnerApi()
+
+        def post_encrypted(wallet, method, params):
+            response = self.api.post_encrypted(wallet, method, params)
+            if 'error' in response:
+                from mwc.wallet_v3 import WalletError
+                raise WalletError(method, params, response['error']['code'], response['error']['message'])
+            return response
+
+        self.patches = [
+            mock.patch.object(WalletV3, 'init_secure_api', lambda wallet: 'ab' * 32),
+            mock.patch.object(WalletV3, 'post_encrypted', post_encrypted),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.manager = WalletManager(max_sessions=1, transport=mock.Mock())
+        self.manager.add_endpoint(URL, 'mwc', 'secret')
+        self.manager.add_wallet(URL, 'a', 'pw')
+        self.manager.add_wallet(URL, 'b', 'pw')
+
+    def tearDown(self):
+        self.api.scan_release.set()
+        for patch in reversed(self.patches):
+            patch.stop()
+
+    def test_evicted_session_reopens(self):
+        a = self.manager.session(URL, 'a')
+        self.manager.session(URL, 'b')
+        self.assertTrue(a.evicted)
+        self.assertEqual(a.retrieve_txs(refresh=False), [{'id': 1, 'wallet': 'a'}])
+        self.assertEqual(self.api.calls.count('open_wallet'), 3)
+        self.assertEqual(self.api.calls.count('close_wallet'), 2)
+
+    def test_long_call_does_not_block_lookups(self):
+        a = self.manager.session(URL, 'a')
+        worker = threading.Thread(target=a.scan)
+        worker.start()
+        self.assertTrue(self.api.scan_started.wait(5))
+
+        start = time.monotonic()
+        b = self.manager.session(URL, 'b')
+        self.assertEqual(b.retrieve_txs(refresh=False), [{'id': 1, 'wallet': 'b'}])
+        self.assertLess(time.monotonic() - start, 1)
+        # Wallet a is busy, it is not closed under the running scan
+        self.assertNotIn('close_wallet', self.api.calls)
+
+        self.api.scan_release.set()
+        worker.join(5)
+        self.manager.close()
+        self.assertEqual(self.api.calls.count('close_wallet'), 2)
+
+    def test_accounts_share_one_opened_wallet(self):
+        self.manager.max_sessions = 4
+        self.manager.session(URL, 'a', 'default').retrieve_txs(refresh=False)
+        self.manager.session(URL, 'a', 'savings').retrieve_txs(refresh=False)
+        self.manager.session(URL, 'a', 'savings').retrieve_txs(refresh=False)
+        self.assertEqual(self.api.calls.count('open_wallet'), 1)
+        self.assertEqual(self.api.calls.count('set_active_account'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()